@@ -1,4 +1,4 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify, abort, send_file
+from flask import Flask, render_template, request, redirect, url_for, jsonify, abort, send_file, g
 
 import json
 import os
@@ -8,14 +8,31 @@ import subprocess
 import re
 import fcntl
 import base64
-import urllib.request
-import urllib.error
+import http.client
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+import atexit
+import sqlite3
+from contextlib import contextmanager
+from collections import OrderedDict
+import hashlib
+import uuid
+import gzip
+import mimetypes
+import bisect
+import functools
+import itertools
+import contextvars
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import click
 
 from flask import jsonify
 
-from io import BytesIO
-
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font, Alignment, PatternFill
 from openpyxl.utils import get_column_letter
 from openpyxl.chart import BarChart, Reference
@@ -23,16 +40,155 @@ from openpyxl.chart import BarChart, Reference
 
 app = Flask(__name__)
 
+# -- METRICS
+# In-process Prometheus-style metrics, rendered as text at /metrics. Each gunicorn worker
+# keeps its own numbers (every series carries a worker="<pid>" label); recording one
+# observation is a bisect plus a few adds under a lock, so it stays on in production.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").strip().lower() not in ("0", "false", "no", "off")
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+METRICS_HELP = {
+    "redchurch_request_duration_seconds": ("histogram", "Request handling time by route, method and status."),
+    "redchurch_operation_duration_seconds": ("histogram", "Time spent in load_*/save_*/workbook helpers."),
+    "redchurch_operation_errors_total": ("counter", "Helper calls that raised."),
+    "redchurch_git_duration_seconds": ("histogram", "git subprocess time by subcommand."),
+    "redchurch_github_api_duration_seconds": ("histogram", "GitHub API round-trip time by method and status."),
+    "redchurch_persist_push_total": ("counter", "Persistence pushes by method and result."),
+    "redchurch_persist_fallback_total": ("counter", "Times persistence fell back to the GitHub API, by reason."),
+    "redchurch_file_commit_seconds": ("histogram", "Temp write + fsync + rename time per data-file commit."),
+    "redchurch_file_commits_total": ("counter", "Data-file commits (one fsync + rename each), by file."),
+    "redchurch_file_commit_writes_total": ("counter", "Saves folded into data-file commits, by file."),
+    "redchurch_response_bytes_total": ("counter", "Compressed response bytes before (stage=raw) and after (stage=sent) compression."),
+}
+
+_metrics_lock = threading.Lock()
+_metrics_histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+_metrics_counters = {}  # (name, labels) -> value
+
+def metrics_observe(name: str, seconds: float, **labels):
+    if not METRICS_ENABLED:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    i = bisect.bisect_left(METRICS_BUCKETS, seconds)
+    with _metrics_lock:
+        h = _metrics_histograms.get(key)
+        if h is None:
+            h = _metrics_histograms[key] = [0] * (len(METRICS_BUCKETS) + 2)
+        if i < len(METRICS_BUCKETS):
+            h[i] += 1
+        h[-2] += seconds
+        h[-1] += 1
+
+def metrics_inc(name: str, amount: float = 1, **labels):
+    if not METRICS_ENABLED:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _metrics_lock:
+        _metrics_counters[key] = _metrics_counters.get(key, 0) + amount
+
+@contextmanager
+def metrics_timer(name: str, **labels):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics_observe(name, time.perf_counter() - started, **labels)
+
+def timed(fn):
+    """Record fn's duration (and failures) under redchurch_operation_duration_seconds{op=fn.__name__}."""
+    op = fn.__name__
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            metrics_inc("redchurch_operation_errors_total", op=op)
+            raise
+        finally:
+            metrics_observe("redchurch_operation_duration_seconds", time.perf_counter() - started, op=op)
+    return wrapper
+
+def _metrics_escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _metrics_labels(labels, extra=()) -> str:
+    pairs = list(labels) + [("worker", str(os.getpid()))] + list(extra)
+    return "{" + ",".join(f'{k}="{_metrics_escape(v)}"' for k, v in pairs) + "}"
+
+def _metrics_number(v) -> str:
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+def render_metrics(extra_gauges: dict | None = None) -> str:
+    with _metrics_lock:
+        histograms = {k: list(v) for k, v in _metrics_histograms.items()}
+        counters = dict(_metrics_counters)
+
+    by_name = {}
+    for (name, labels), h in histograms.items():
+        by_name.setdefault(name, []).append((labels, h))
+    for (name, labels), v in counters.items():
+        by_name.setdefault(name, []).append((labels, v))
+    for name, (kind, help_text, samples) in (extra_gauges or {}).items():
+        METRICS_HELP.setdefault(name, (kind, help_text))
+        by_name.setdefault(name, []).extend(samples)
+
+    lines = []
+    for name in sorted(by_name):
+        kind, help_text = METRICS_HELP.get(name, ("untyped", ""))
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in sorted(by_name[name], key=lambda s: s[0]):
+            if kind != "histogram":
+                lines.append(f"{name}{_metrics_labels(labels)} {_metrics_number(value)}")
+                continue
+            cumulative = 0
+            for bound, n in zip(METRICS_BUCKETS, value):
+                cumulative += n
+                lines.append(f"{name}_bucket{_metrics_labels(labels, [('le', repr(bound))])} {cumulative}")
+            lines.append(f"{name}_bucket{_metrics_labels(labels, [('le', '+Inf')])} {value[-1]}")
+            lines.append(f"{name}_sum{_metrics_labels(labels)} {_metrics_number(value[-2])}")
+            lines.append(f"{name}_count{_metrics_labels(labels)} {value[-1]}")
+    return "\n".join(lines) + "\n"
+
+@app.before_request
+def _metrics_start_request():
+    g.metrics_started = time.perf_counter()
+
+@app.after_request
+def _metrics_note_status(response):
+    g.metrics_status = response.status_code
+    return response
+
+@app.teardown_request
+def _metrics_finish_request(exc):
+    started = g.get("metrics_started")
+    if started is None:
+        return
+    rule = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    status = g.get("metrics_status", 500)
+    metrics_observe(
+        "redchurch_request_duration_seconds",
+        time.perf_counter() - started,
+        route=rule, method=request.method, status=str(status),
+    )
+
 # -- Persistence Storage for Waste Log
 REPO_DIR = os.path.dirname(os.path.abspath(__file__))
 GIT_BRANCH = os.getenv("GIT_BRANCH", "main")
 GIT_REMOTE = "origin"
 GIT_LOCK_PATH = "/tmp/git_persist.lock"  # ✅ fix: always exists on Render/Linux
+# Written by whichever worker does the boot pull; the others trust a recent successful one
+# instead of pulling again (a failed pull leaves the next worker to try).
+BOOT_SYNC_MARKER_PATH = "/tmp/git_boot_sync.json"
+BOOT_SYNC_MAX_AGE_SECONDS = float(os.getenv("BOOT_SYNC_MAX_AGE_SECONDS", "300"))
 
 # If Render doesn't include a .git folder at runtime (common), this fallback still persists
-# JSON files by committing directly through the GitHub Contents API.
+# JSON files by committing directly through the GitHub API (Contents API for one file,
+# Git Data API when several files change together).
 GITHUB_REPO_SLUG = os.getenv("GITHUB_REPO_SLUG", "joacotol/redchurch_inventory_system")
-PERSIST_FILES = ["waste_logs.json", "pastry_prices.json"]
+# Per location; see LOCATIONS for where each location keeps them.
+PERSIST_FILES = ["waste_logs.json", "waste_logs.journal.jsonl", "pastry_prices.json", "pastry_price_history.jsonl"]
 
 def _abs_path(rel_or_abs: str) -> str:
     return rel_or_abs if os.path.isabs(rel_or_abs) else os.path.join(REPO_DIR, rel_or_abs)
@@ -40,8 +196,365 @@ def _abs_path(rel_or_abs: str) -> str:
 def _repo_has_git() -> bool:
     return os.path.isdir(os.path.join(REPO_DIR, ".git"))
 
+# -- ATOMIC FILE WRITES
+# Data files are never truncated in place: a save goes to a temp file next to the target,
+# is fsynced, then renamed over it (and the directory fsynced), so a reader, a boot pull or
+# a crash sees the old file or the new one, never a mix. Writers of one file take a flock
+# (shared by every worker) around read-modify-write, and within a worker they group-commit:
+# the first save waits FILE_COMMIT_WINDOW_SECONDS, then writes everything that queued up
+# with one fsync + rename, while saves arriving meanwhile form the next batch. In a batch,
+# whole-file writes collapse to the last one and update_json_file() callbacks run in
+# arrival order on the freshly read file, so concurrent adds don't drop each other.
+FILE_COMMIT_WINDOW_SECONDS = float(os.getenv("FILE_COMMIT_WINDOW_SECONDS", "0.002"))
+FILE_LOCK_DIR = os.getenv("FILE_LOCK_DIR", "/tmp/redchurch_file_locks")
+
+_MISSING = object()
+
+def _dump_json(value, f):
+    json.dump(value, f, indent=2, ensure_ascii=False)
+
+def _dump_json_compact(value, f):
+    # dumps() uses the C encoder; dump() streams through the pure-Python one.
+    f.write(json.dumps(value, ensure_ascii=False, separators=(",", ":")))
+
+def _dump_bytes(value, f):
+    f.buffer.write(value)
+
+class _FileWrite:
+    __slots__ = ("value", "update", "dump", "result", "error", "done")
+
+    def __init__(self, value=_MISSING, update=None, dump=_dump_json):
+        self.value = value
+        self.update = update
+        self.dump = dump
+        self.result = None
+        self.error = None
+        self.done = False
+
+    def outcome(self):
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+class _FileCommitter:
+    """Queue and leader for one data file in this worker."""
+
+    def __init__(self, path: str):
+        self.path = path
+        digest = hashlib.sha1(path.encode("utf-8")).hexdigest()[:12]
+        self.lock_path = os.path.join(FILE_LOCK_DIR, f"{os.path.basename(path)}.{digest}.lock")
+        self.label = os.path.basename(path)
+        self.cond = threading.Condition()
+        self.pending = []
+        self.leading = False
+
+    def commit(self, op: _FileWrite, gather: bool = True):
+        with self.cond:
+            self.pending.append(op)
+            if self.leading:
+                while not op.done:
+                    self.cond.wait()
+                return op.outcome()
+            self.leading = True
+
+        # This save leads: gather company, then drain batches until nobody is waiting.
+        if gather and FILE_COMMIT_WINDOW_SECONDS > 0:
+            time.sleep(FILE_COMMIT_WINDOW_SECONDS)
+        while True:
+            with self.cond:
+                batch, self.pending = self.pending, []
+                if not batch:
+                    self.leading = False
+                    break
+            self._write_batch(batch)
+            with self.cond:
+                for queued in batch:
+                    queued.done = True
+                self.cond.notify_all()
+        return op.outcome()
+
+    def _read(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_batch(self, batch: list):
+        try:
+            os.makedirs(FILE_LOCK_DIR, exist_ok=True)
+            with open(self.lock_path, "w") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                value = _MISSING
+                dump = None
+                for op in batch:
+                    if op.update is None:
+                        value = op.value
+                    else:
+                        current = self._read() if value is _MISSING else value
+                        try:
+                            value = op.update(current)
+                        except Exception as e:
+                            op.error = e
+                            continue
+                    op.result = value
+                    dump = op.dump
+                if dump is not None:
+                    with metrics_timer("redchurch_file_commit_seconds", file=self.label):
+                        _replace_file(self.path, value, dump)
+                    metrics_inc("redchurch_file_commits_total", file=self.label)
+                    metrics_inc("redchurch_file_commit_writes_total", len(batch), file=self.label)
+        except Exception as e:
+            for op in batch:
+                if op.error is None:
+                    op.error = e
+
+def _replace_file(path: str, value, dump, durable: bool = True):
+    """Temp file + os.replace. durable=False skips the fsyncs, for files that can be rebuilt."""
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            dump(value, f)
+            if durable:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    if not durable:
+        return
+    # The rename itself is only durable once the directory entry is.
+    dir_fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+_file_committers = {}  # abs path -> _FileCommitter
+_file_committers_lock = threading.Lock()
+
+def _file_committer(rel_path: str) -> _FileCommitter:
+    path = _abs_path(rel_path)
+    with _file_committers_lock:
+        committer = _file_committers.get(path)
+        if committer is None:
+            committer = _file_committers[path] = _FileCommitter(path)
+    return committer
+
+def write_json_file(rel_path: str, data, dump=_dump_json, gather: bool = True):
+    """
+    Replace a JSON data file atomically; returns once it is on disk. Pass gather=False when
+    the caller already serialises writers (e.g. under the journal lock), so there is no
+    company worth waiting for.
+    """
+    _file_committer(rel_path).commit(_FileWrite(value=data, dump=dump), gather)
+
+def write_file_bytes(rel_path: str, data: bytes):
+    """Replace a file with raw bytes (e.g. a pulled copy) through the same writer lock."""
+    _file_committer(rel_path).commit(_FileWrite(value=data, dump=_dump_bytes), gather=False)
+
+def update_json_file(rel_path: str, update, dump=_dump_json):
+    """
+    Read-modify-write under the file's writer lock: update(current) gets the parsed file
+    (None if missing) and returns the new contents, which are written and returned.
+    """
+    return _file_committer(rel_path).commit(_FileWrite(update=update, dump=dump))
+
+# -- LOCATIONS
+# Each café is a location with its own shard of waste logs, prices, price history and carts.
+# locations.json lists them in order; the first is the default and keeps its files at the
+# repo root (so a single-café deploy is unchanged), the others under locations/<slug>/.
+# A request picks its location by URL prefix (/loc/<slug>/waste) or the X-Redchurch-Location
+# header; CLI commands take --location. The catalog is shared by every location.
+LOCATIONS_FILE = "locations.json"
+LOCATIONS_DIR = "locations"
+LOCATION_URL_PREFIX = "/loc"
+LOCATION_HEADER = "X-Redchurch-Location"
+LOCATION_SLUG_RE = re.compile(r"[a-z0-9][a-z0-9-]{0,39}")
+# Set in the environment of cross-location pool processes (see CROSS-LOCATION ROLLUP).
+LOCATION_POOL_CHILD_ENV = "REDCHURCH_LOCATION_POOL_CHILD"
+
+class Location:
+    def __init__(self, slug: str, name: str, address: str = "", manager: str = "", data_dir: str = ""):
+        self.slug = slug
+        self.name = name
+        self.address = address
+        self.manager = manager
+        self.data_dir = data_dir  # relative to REPO_DIR; "" for the default location
+
+    def file(self, rel: str) -> str:
+        """Repo-relative path of this location's copy of a per-location data file."""
+        return f"{self.data_dir}/{rel}" if self.data_dir else rel
+
+    def tmp(self, path: str) -> str:
+        """This location's variant of a scratch path (/tmp/x.db -> /tmp/x.<slug>.db)."""
+        if not self.data_dir:
+            return path
+        stem, ext = os.path.splitext(path)
+        return f"{stem}.{self.slug}{ext}"
+
+    def to_dict(self) -> dict:
+        return {"slug": self.slug, "name": self.name, "address": self.address, "manager": self.manager}
+
+DEFAULT_LOCATION_RECORD = {
+    "slug": "hamilton",
+    "name": "Redchurch Cafe",
+    "address": "68 King Street E, Hamilton ON",
+    "manager": "Stefanie Forget",
+}
+
+def _read_locations() -> dict:
+    try:
+        with open(_abs_path(LOCATIONS_FILE), "r", encoding="utf-8") as f:
+            records = json.load(f)
+    except FileNotFoundError:
+        records = []
+    except ValueError as e:
+        print(f"[WARN] {LOCATIONS_FILE} is not valid JSON ({e}); serving the default location only")
+        records = []
+
+    locations = {}
+    for rec in records if isinstance(records, list) else []:
+        slug = str((rec or {}).get("slug", "")).strip().lower()
+        if not LOCATION_SLUG_RE.fullmatch(slug) or slug in locations:
+            print(f"[WARN] Skipping location with missing, invalid or duplicate slug: {rec!r}")
+            continue
+        locations[slug] = Location(
+            slug,
+            str(rec.get("name") or slug),
+            str(rec.get("address") or ""),
+            str(rec.get("manager") or ""),
+            "" if not locations else f"{LOCATIONS_DIR}/{slug}",
+        )
+    if not locations:
+        rec = DEFAULT_LOCATION_RECORD
+        locations[rec["slug"]] = Location(rec["slug"], rec["name"], rec["address"], rec["manager"])
+
+    for loc in locations.values():
+        if loc.data_dir:
+            os.makedirs(_abs_path(loc.data_dir), exist_ok=True)
+    return locations
+
+LOCATIONS = _read_locations()
+DEFAULT_LOCATION = next(iter(LOCATIONS.values()))
+_location_var = contextvars.ContextVar("redchurch_location", default=None)
+
+def current_location() -> Location:
+    return _location_var.get() or DEFAULT_LOCATION
+
+@contextmanager
+def using_location(loc: Location):
+    token = _location_var.set(loc)
+    try:
+        yield loc
+    finally:
+        _location_var.reset(token)
+
+def loc_file(rel: str) -> str:
+    return current_location().file(rel)
+
+def loc_tmp(path: str) -> str:
+    return current_location().tmp(path)
+
+def location_files(rel_files: list) -> list:
+    """rel_files for every location, e.g. everything a boot pull has to fetch."""
+    return [loc.file(rel) for loc in LOCATIONS.values() for rel in rel_files]
+
+class LocationPrefixMiddleware:
+    """
+    Serves /loc/<slug>/... as if the app were mounted at /loc/<slug>: the prefix moves into
+    SCRIPT_NAME, so routes stay unprefixed and url_for() keeps the location in every link.
+    """
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        path = environ.get("PATH_INFO", "")
+        if path.startswith(LOCATION_URL_PREFIX + "/"):
+            slug, _, rest = path[len(LOCATION_URL_PREFIX) + 1:].partition("/")
+            if slug in LOCATIONS:
+                environ["SCRIPT_NAME"] = environ.get("SCRIPT_NAME", "") + f"{LOCATION_URL_PREFIX}/{slug}"
+                environ["PATH_INFO"] = "/" + rest
+                environ["redchurch.location"] = slug
+        return self.wsgi_app(environ, start_response)
+
+app.wsgi_app = LocationPrefixMiddleware(app.wsgi_app)
+
+@app.before_request
+def _select_location():
+    slug = request.environ.get("redchurch.location") or (request.headers.get(LOCATION_HEADER) or "").strip().lower()
+    loc = LOCATIONS.get(slug) if slug else DEFAULT_LOCATION
+    if loc is None:
+        abort(404, f"Unknown location: {slug}")
+    g.location = loc
+    # Sync workers reuse the thread, so this is (re)set on every request.
+    _location_var.set(loc)
+
+@app.after_request
+def _vary_on_location_header(response):
+    if LOCATION_HEADER in request.headers:
+        response.vary.add(LOCATION_HEADER)
+    return response
+
+@app.context_processor
+def _location_template_context():
+    return {"location": current_location(), "locations": list(LOCATIONS.values())}
+
+def location_command(fn):
+    """Adds --location <slug> to a CLI command and runs it as that location (default: the first)."""
+    @click.option("--location", "location_slug", default=None, help="Location slug from locations.json.")
+    @functools.wraps(fn)
+    def wrapper(location_slug, *args, **kwargs):
+        loc = LOCATIONS.get((location_slug or "").strip().lower()) if location_slug else DEFAULT_LOCATION
+        if loc is None:
+            raise click.BadParameter(f"unknown location {location_slug!r}", param_hint="--location")
+        with using_location(loc):
+            return fn(*args, **kwargs)
+    return wrapper
+
+# One keep-alive HTTPS connection per thread; a save's GitHub calls share it. GitHub drops
+# idle keep-alive connections, and the persist queue waits at least PERSIST_COALESCE_SECONDS
+# between pushes, so a connection idle longer than GITHUB_CONN_IDLE_SECONDS is reopened.
+GITHUB_CONN_IDLE_SECONDS = float(os.getenv("GITHUB_CONN_IDLE_SECONDS", "5"))
+_github_conn_local = threading.local()
+
+# path -> last known blob sha on GIT_BRANCH, so a PUT doesn't need a GET first.
+_github_sha_cache = {}
+# Last commit we saw at the branch head: {"commit": sha, "tree": sha}.
+_github_head_cache = {}
+GITHUB_CONFLICT_STATUSES = (409, 422)
+
+def _github_connection(host: str):
+    """(connection, reused): reused is False for a freshly opened connection."""
+    conn = getattr(_github_conn_local, "conn", None)
+    idle = time.monotonic() - getattr(_github_conn_local, "last_used", 0.0)
+    if conn is not None and (conn.host != host or idle > GITHUB_CONN_IDLE_SECONDS):
+        conn.close()
+        conn = None
+    reused = conn is not None
+    if conn is None:
+        conn = http.client.HTTPSConnection(host, timeout=20)
+        _github_conn_local.conn = conn
+    return conn, reused
+
 def _github_api_json(method: str, url: str, body: dict | None = None):
     """GitHub API helper (keeps token out of logs). Returns (status_code, json_dict)."""
+    started = time.perf_counter()
+    status, data = _github_api_request(method, url, body)
+    metrics_observe(
+        "redchurch_github_api_duration_seconds",
+        time.perf_counter() - started,
+        method=method, status=str(status or "error"),
+    )
+    return status, data
+
+def _github_api_request(method: str, url: str, body: dict | None):
     token = os.getenv("GITHUB_TOKEN")
     if not token:
         return None, {"error": "GITHUB_TOKEN not set"}
@@ -50,25 +563,44 @@ def _github_api_json(method: str, url: str, body: dict | None = None):
     if body is not None:
         data = json.dumps(body).encode("utf-8")
 
-    req = urllib.request.Request(url, method=method)
-    req.add_header("Authorization", f"Bearer {token}")
-    req.add_header("Accept", "application/vnd.github+json")
-    req.add_header("User-Agent", "redchurch-inventory-system")
+    headers = {
+        "Authorization": f"Bearer {token}",
+        "Accept": "application/vnd.github+json",
+        "User-Agent": "redchurch-inventory-system",
+    }
     if data is not None:
-        req.add_header("Content-Type", "application/json")
-
-    try:
-        with urllib.request.urlopen(req, data=data, timeout=20) as resp:
+        headers["Content-Type"] = "application/json"
+
+    parts = urllib.parse.urlsplit(url)
+    target = parts.path + (f"?{parts.query}" if parts.query else "")
+
+    # Reads are replayed once on a fresh connection after any failure. A POST/PUT/PATCH is
+    # only replayed when a reused keep-alive connection was dropped before a response began
+    # (the server closed it while idle, so it never took the request); once a response has
+    # started the write may have landed, and resending it could create a second commit.
+    for attempt in range(2):
+        conn, reused = _github_connection(parts.netloc)
+        resp = None
+        try:
+            conn.request(method, target, body=data, headers=headers)
+            resp = conn.getresponse()
             raw = resp.read().decode("utf-8")
-            return resp.status, json.loads(raw) if raw else {}
-    except urllib.error.HTTPError as e:
+        except Exception as e:
+            conn.close()
+            _github_conn_local.conn = None
+            stale = reused and resp is None and isinstance(
+                e, (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError)
+            )
+            if attempt == 0 and (method in ("GET", "HEAD") or stale):
+                continue  # reconnect once
+            return None, {"error": str(e)}
+        finally:
+            _github_conn_local.last_used = time.monotonic()
+
         try:
-            raw = e.read().decode("utf-8")
-            return e.code, json.loads(raw) if raw else {"error": "http error"}
+            return resp.status, json.loads(raw) if raw else ({"error": "http error"} if resp.status >= 400 else {})
         except Exception:
-            return e.code, {"error": "http error"}
-    except Exception as e:
-        return None, {"error": str(e)}
+            return resp.status, {"error": "http error"}
 
 def _github_get_file_bytes(path: str, branch: str):
     url = f"https://api.github.com/repos/{GITHUB_REPO_SLUG}/contents/{path}?ref={urllib.parse.quote(branch)}"
@@ -79,34 +611,125 @@ def _github_get_file_bytes(path: str, branch: str):
     # GitHub may insert newlines
     content_b64 = content_b64.replace("\n", "")
     try:
-        return base64.b64decode(content_b64), data.get("sha")
+        content = base64.b64decode(content_b64)
     except Exception:
         return None, None
+    if data.get("sha"):
+        _github_sha_cache[path] = data["sha"]
+    return content, data.get("sha")
 
 def _github_put_file_bytes(path: str, branch: str, message: str, content_bytes: bytes):
-    # Need sha if file exists
-    _, sha = _github_get_file_bytes(path, branch)
+    # Need sha if file exists; trust the cached one and only re-read it on a conflict.
+    if path in _github_sha_cache:
+        sha = _github_sha_cache[path]
+    else:
+        _, sha = _github_get_file_bytes(path, branch)
+
     url = f"https://api.github.com/repos/{GITHUB_REPO_SLUG}/contents/{path}"
-    body = {
-        "message": message,
-        "content": base64.b64encode(content_bytes).decode("ascii"),
-        "branch": branch,
-    }
-    if sha:
-        body["sha"] = sha
-    status, data = _github_api_json("PUT", url, body=body)
-    return status in (200, 201), status, data
+    for attempt in range(2):
+        body = {
+            "message": message,
+            "content": base64.b64encode(content_bytes).decode("ascii"),
+            "branch": branch,
+        }
+        if sha:
+            body["sha"] = sha
+        status, data = _github_api_json("PUT", url, body=body)
+
+        if status in (200, 201):
+            new_sha = ((data or {}).get("content") or {}).get("sha")
+            if new_sha:
+                _github_sha_cache[path] = new_sha
+            commit = (data or {}).get("commit") or {}
+            if commit.get("sha") and (commit.get("tree") or {}).get("sha"):
+                _github_head_cache[branch] = {"commit": commit["sha"], "tree": commit["tree"]["sha"]}
+            return True, status, data
+
+        if status not in GITHUB_CONFLICT_STATUSES or attempt:
+            break
+        _github_sha_cache.pop(path, None)
+        _, sha = _github_get_file_bytes(path, branch)
+
+    return False, status, data
+
+def _github_commit_files(paths: list, branch: str, message: str):
+    """
+    Commit several files at once through the Git Data API (tree -> commit -> ref).
+    With a cached branch head that's three requests however many files change;
+    a moved head (422 on the ref update) refreshes it and retries once.
+    """
+    api = f"https://api.github.com/repos/{GITHUB_REPO_SLUG}/git"
+
+    tree_entries = []
+    for path in paths:
+        with open(_abs_path(path), "rb") as f:
+            content_bytes = f.read()
+        try:
+            tree_entries.append({"path": path, "mode": "100644", "type": "blob", "content": content_bytes.decode("utf-8")})
+        except UnicodeDecodeError:
+            status, blob = _github_api_json("POST", f"{api}/blobs", body={
+                "content": base64.b64encode(content_bytes).decode("ascii"),
+                "encoding": "base64",
+            })
+            if status != 201:
+                return False, status
+            tree_entries.append({"path": path, "mode": "100644", "type": "blob", "sha": blob.get("sha")})
+
+    status = None
+    for attempt in range(2):
+        head = _github_head_cache.get(branch)
+        if head is None:
+            status, ref = _github_api_json("GET", f"{api}/ref/heads/{urllib.parse.quote(branch)}")
+            if status != 200:
+                return False, status
+            commit_sha = ref["object"]["sha"]
+            status, commit = _github_api_json("GET", f"{api}/commits/{commit_sha}")
+            if status != 200:
+                return False, status
+            head = {"commit": commit_sha, "tree": commit["tree"]["sha"]}
+
+        status, tree = _github_api_json("POST", f"{api}/trees", body={"base_tree": head["tree"], "tree": tree_entries})
+        if status != 201:
+            return False, status
+
+        status, commit = _github_api_json("POST", f"{api}/commits", body={
+            "message": message,
+            "tree": tree["sha"],
+            "parents": [head["commit"]],
+        })
+        if status != 201:
+            return False, status
+
+        status, _ = _github_api_json("PATCH", f"{api}/refs/heads/{urllib.parse.quote(branch)}", body={"sha": commit["sha"]})
+        if status == 200:
+            _github_head_cache[branch] = {"commit": commit["sha"], "tree": tree["sha"]}
+            for entry in tree.get("tree", []):
+                if entry.get("path") in paths:
+                    _github_sha_cache[entry["path"]] = entry.get("sha")
+            return True, status
+
+        # Someone else moved the branch (or our cached head is stale): start from the real head.
+        _github_head_cache.pop(branch, None)
+        if status not in GITHUB_CONFLICT_STATUSES:
+            break
+
+    return False, status
 
 def _persist_pull_fallback(branch: str):
     """Pull persisted JSON files directly from GitHub (works even without .git)."""
+    _github_head_cache.pop(branch, None)
+
+    # Fetch every file concurrently; each thread gets its own keep-alive connection.
+    files = location_files(PERSIST_FILES)
+    with ThreadPoolExecutor(max_workers=min(len(files), 16)) as pool:
+        fetched = list(pool.map(lambda fname: _github_get_file_bytes(fname, branch), files))
+
     pulled_any = False
-    for fname in PERSIST_FILES:
-        b, _ = _github_get_file_bytes(fname, branch)
+    for fname, (b, _) in zip(files, fetched):
         if b is None:
             continue
         try:
-            with open(_abs_path(fname), "wb") as f:
-                f.write(b)
+            write_file_bytes(fname, b)
             pulled_any = True
         except Exception as e:
             print(f"[WARN] GitHub API pull failed writing {fname}: {e}")
@@ -114,6 +737,7 @@ def _persist_pull_fallback(branch: str):
         print("[OK] GitHub API pull completed")
     else:
         print("[WARN] GitHub API pull did not retrieve any files")
+    return pulled_any
 
 def _persist_push_fallback(file_path: str, message: str, branch: str):
     """Push a single file through GitHub Contents API."""
@@ -122,22 +746,43 @@ def _persist_push_fallback(file_path: str, message: str, branch: str):
             content_bytes = f.read()
     except Exception as e:
         print(f"[WARN] GitHub API push could not read {file_path}: {e}")
-        return
+        return False
 
     ok, status, _ = _github_put_file_bytes(file_path, branch, message, content_bytes)
     if ok:
         print(f"[OK] Persisted {file_path} via GitHub API")
     else:
         print(f"[WARN] GitHub API push failed for {file_path} (status={status})")
+    return ok
+
+def _persist_push_fallback_many(file_paths: list, message: str, branch: str) -> bool:
+    if len(file_paths) > 1:
+        try:
+            ok, status = _github_commit_files(list(file_paths), branch, message)
+        except Exception as e:
+            ok, status = False, str(e)
+        if ok:
+            print(f"[OK] Persisted {', '.join(file_paths)} via GitHub API (single commit)")
+            metrics_inc("redchurch_persist_push_total", method="github_api", result="ok")
+            return True
+        print(f"[WARN] GitHub API multi-file commit failed (status={status}); pushing files one by one")
+        metrics_inc("redchurch_persist_fallback_total", reason="multi_file_commit_failed")
+
+    ok = True
+    for file_path in file_paths:
+        ok = _persist_push_fallback(file_path, message, branch) and ok
+    metrics_inc("redchurch_persist_push_total", method="github_api", result="ok" if ok else "error")
+    return ok
 
 def _git(args):
     """Run a git command in the repo folder (never prints token)."""
-    return subprocess.run(
-        ["git"] + args,
-        cwd=REPO_DIR,
-        capture_output=True,
-        text=True,
-    )
+    with metrics_timer("redchurch_git_duration_seconds", command=args[0] if args else ""):
+        return subprocess.run(
+            ["git"] + args,
+            cwd=REPO_DIR,
+            capture_output=True,
+            text=True,
+        )
 
 def _ensure_git_identity():
     # Prevents 'Please tell me who you are' commit failures
@@ -150,16 +795,56 @@ def _set_origin_with_token(token: str):
     url = f"https://{token}@github.com/{GITHUB_REPO_SLUG}.git"
     _git(["remote", "set-url", GIT_REMOTE, url])
 
+def _read_boot_sync_marker():
+    try:
+        with open(BOOT_SYNC_MARKER_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+def _boot_sync_is_fresh(marker) -> bool:
+    """Only a successful sync younger than BOOT_SYNC_MAX_AGE_SECONDS is trusted, whoever ran it."""
+    if not isinstance(marker, dict) or not marker.get("ok"):
+        return False
+    return time.time() - float(marker.get("finished_at", 0)) < BOOT_SYNC_MAX_AGE_SECONDS
+
+def _write_boot_sync_marker(method: str, ok: bool, started: float):
+    marker = {
+        "method": method,
+        "ok": ok,
+        "pid": os.getpid(),
+        "master_pid": os.getppid(),
+        "finished_at": time.time(),
+        "duration_ms": round((time.time() - started) * 1000, 1),
+    }
+    try:
+        with open(BOOT_SYNC_MARKER_PATH, "w", encoding="utf-8") as f:
+            json.dump(marker, f)
+    except Exception as e:
+        print(f"[WARN] Could not write boot sync marker: {e}")
+    print(f"[OK] boot sync via {method} finished in {marker['duration_ms']} ms (ok={ok})")
+
+def boot_sync_status():
+    return _read_boot_sync_marker()
+
 def git_pull_on_boot():
     """
     Pull latest persisted JSON files after Render restarts/sleeps.
-    Uses /tmp lock to avoid multi-worker collisions.
+    Single-flight: the first worker to take the /tmp lock syncs and writes a marker;
+    the rest see the marker and skip straight to serving.
     """
     token = os.getenv("GITHUB_TOKEN")  # ✅ prevents NameError
     if not token:
         print("[WARN] GITHUB_TOKEN not set; skipping git pull on boot")
         return
+    if os.getenv(LOCATION_POOL_CHILD_ENV):
+        return  # a cross-location pool process; the worker that started it already synced
+
+    # Cheap check before queueing on the lock behind the worker that is syncing.
+    if _boot_sync_is_fresh(_read_boot_sync_marker()):
+        return
 
+    started = time.time()
     try:
         # lock file (works even across multiple gunicorn workers)
         with open(GIT_LOCK_PATH, "w") as lock_file:
@@ -169,9 +854,16 @@ def git_pull_on_boot():
             except Exception:
                 pass
 
+            marker = _read_boot_sync_marker()
+            if _boot_sync_is_fresh(marker):
+                print(f"[OK] boot sync already done by pid {marker.get('pid')}; skipping")
+                return
+            started = time.time()
+
             # If Render runtime doesn't include .git, fall back to GitHub API.
             if not _repo_has_git():
-                _persist_pull_fallback(GIT_BRANCH)
+                ok = _persist_pull_fallback(GIT_BRANCH)
+                _write_boot_sync_marker("github-api", ok, started)
                 return
 
             _ensure_git_identity()
@@ -182,13 +874,16 @@ def git_pull_on_boot():
             r2 = _git(["reset", "--hard", f"{GIT_REMOTE}/{GIT_BRANCH}"])
             if r1.returncode == 0 and r2.returncode == 0:
                 print("[OK] git pull on boot completed")
+                _write_boot_sync_marker("git", True, started)
             else:
                 print("[WARN] git pull on boot failed; trying GitHub API fallback")
-                _persist_pull_fallback(GIT_BRANCH)
+                ok = _persist_pull_fallback(GIT_BRANCH)
+                _write_boot_sync_marker("github-api", ok, started)
     except Exception as e:
         print(f"[WARN] git pull failed on boot: {e}; trying GitHub API fallback")
         try:
-            _persist_pull_fallback(GIT_BRANCH)
+            ok = _persist_pull_fallback(GIT_BRANCH)
+            _write_boot_sync_marker("github-api", ok, started)
         except Exception:
             pass
 
@@ -196,8 +891,6 @@ def git_pull_on_boot():
 git_pull_on_boot()
 
 FILE_NAME = "catalog.json"
-orders = {}  # sku -> qty
-GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
 
 
 TYPE_ORDER = [
@@ -217,6 +910,30 @@ CUP_SUBTYPE_ORDER = {
 
 WASTE_FILE = "waste_logs.json"
 PASTRY_PRICES_FILE = "pastry_prices.json"
+# One record appended per price change; see PRICE HISTORY.
+PASTRY_PRICE_HISTORY_FILE = "pastry_price_history.jsonl"
+
+# Each daily save appends one record here; _read_waste_logs() replays it on top of WASTE_FILE.
+WASTE_JOURNAL_FILE = "waste_logs.journal.jsonl"
+# Fold the journal back into WASTE_FILE once it holds this many records.
+WASTE_JOURNAL_COMPACT_EVERY = int(os.getenv("WASTE_JOURNAL_COMPACT_EVERY", "50"))
+
+# "json" (default) or "sqlite". With sqlite, waste entries and prices are also kept in an
+# indexed database for range reads; the JSON files stay the persisted/pushed format.
+WASTE_BACKEND = os.getenv("WASTE_BACKEND", "json").strip().lower()
+WASTE_DB_PATH = os.getenv("WASTE_DB_PATH", "/tmp/redchurch_waste.db")
+
+# Everything the waste/price pages read (for the current location); their ETags change
+# whenever any of these does.
+def price_data_files() -> list:
+    files = [loc_file(PASTRY_PRICES_FILE), loc_file(PASTRY_PRICE_HISTORY_FILE)]
+    return files + ([loc_tmp(WASTE_DB_PATH)] if WASTE_BACKEND == "sqlite" else [])
+
+def waste_data_files() -> list:
+    return [loc_file(WASTE_FILE), loc_file(WASTE_JOURNAL_FILE)] + price_data_files()
+
+# Per-day and per-week totals, updated by each save and rebuilt from the logs when stale.
+WASTE_ROLLUPS_PATH = os.getenv("WASTE_ROLLUPS_PATH", "/tmp/redchurch_waste_rollups")
 
 WASTE_REASONS = [
     "Not sold",
@@ -235,26 +952,122 @@ WASTE_REASONS = [
 
 # ---------- Helpers ----------
 
-def load_catalog():
+# -- Data cache
+# Parsed JSON is kept per worker and reused until one of its files changes on disk
+# (another worker's save, a boot pull). Cached values are shared: callers must copy
+# before mutating. Entries are keyed by name plus the files' paths, so every location
+# (each with its own files) keeps its own entry and one store's reads never evict another's.
+_data_cache = {}  # (key, *abs paths) -> (signature, value)
+_data_cache_groups = {}  # (group, *abs paths) -> OrderedDict of cache keys, least recently used first
+_data_cache_stats = {"hits": 0, "misses": 0}
+_data_cache_lock = threading.Lock()
+
+def _file_signature(rel_path: str):
+    try:
+        st = os.stat(_abs_path(rel_path))
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+def cached_load(key: str, files: list, loader, group: str = None, max_entries: int = 0):
+    """
+    Keys that are open-ended (one per week asked for) pass a group: only the max_entries
+    most recently used keys of that group stay cached, per location.
+    """
+    # Stat before loading, so a write that races the load only costs one extra reload.
+    sig = tuple(_file_signature(f) for f in files)
+    paths = tuple(_abs_path(f) for f in files)
+    key = (key,) + paths
+    group_key = (group,) + paths if group else None
+    with _data_cache_lock:
+        hit = _data_cache.get(key)
+        if hit is not None and hit[0] == sig:
+            _data_cache_stats["hits"] += 1
+            if group_key in _data_cache_groups:
+                _data_cache_groups[group_key].move_to_end(key)
+            return hit[1]
+        _data_cache_stats["misses"] += 1
+
+    value = loader()
+    with _data_cache_lock:
+        _data_cache[key] = (sig, value)
+        if group_key:
+            recent = _data_cache_groups.setdefault(group_key, OrderedDict())
+            recent[key] = None
+            recent.move_to_end(key)
+            while len(recent) > max_entries:
+                _data_cache.pop(recent.popitem(last=False)[0], None)
+    return value
+
+def data_cache_stats() -> dict:
+    with _data_cache_lock:
+        stats = dict(_data_cache_stats)
+        stats["entries"] = len(_data_cache)
+    return stats
+
+def _read_catalog():
     path = _abs_path(FILE_NAME)
     if not os.path.exists(path):
         return []
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
-def save_catalog(catalog):
-    # Keep file inside repo folder for persistence
-    with open(_abs_path("catalog.json"), "w", encoding="utf-8") as f:
-        json.dump(catalog, f, indent=2, ensure_ascii=False)
-
-    subprocess.run(["git", "add", "catalog.json"])
-    subprocess.run(["git", "commit", "-m", "Update catalog"])
-    subprocess.run([
-        "git",
-        "push",
-        f"https://{GITHUB_TOKEN}@github.com/joacotol/redchurch_inventory_system.git",
-        "main"
-    ])
+@timed
+def load_catalog():
+    return cached_load("catalog", [FILE_NAME], _read_catalog)
+
+@timed
+def add_catalog_item(item: dict):
+    # Appends to what is on disk now, so concurrent adds (any worker) all land.
+    update_json_file(FILE_NAME, lambda catalog: list(catalog or []) + [item])
+    try:
+        persist_files([FILE_NAME], "Update catalog")
+    except Exception as e:
+        print(f"[WARN] Could not push catalog: {e}")
+
+def catalog_sort_key(item):
+    try:
+        type_index = TYPE_ORDER.index(item.get("type", "Other"))
+    except ValueError:
+        type_index = len(TYPE_ORDER)
+
+    name_for_sort = (item.get("display_name") or item["name"]).lower()
+
+    # Special sorting for Cups
+    if item.get("type") == "Cups":
+        return (
+            type_index,
+            cup_subtype(name_for_sort),
+            extract_oz(name_for_sort),
+            name_for_sort
+        )
+
+    # Default sorting for all other types
+    return (type_index, name_for_sort)
+
+def _build_catalog_index():
+    catalog = load_catalog()
+    sorted_items = sorted(catalog, key=catalog_sort_key)
+
+    by_sku = {}     # sku -> item (first one wins, like the old linear scans)
+    position = {}   # sku -> index in catalog.json, to keep its order in summaries
+    for pos, item in enumerate(catalog):
+        if item["sku"] not in by_sku:
+            by_sku[item["sku"]] = item
+            position[item["sku"]] = pos
+
+    return {"sorted": sorted_items, "by_sku": by_sku, "position": position}
+
+@timed
+def load_catalog_index():
+    """Sorted display list and sku -> item/position maps, rebuilt only when catalog.json changes."""
+    return cached_load("catalog_index", [FILE_NAME], _build_catalog_index)
+
+def catalog_items_in_order(orders: dict) -> list:
+    """(item, qty) for each SKU in the cart, in catalog order. Cost depends on cart size only."""
+    idx = load_catalog_index()
+    skus = sorted((sku for sku in orders if sku in idx["by_sku"]), key=idx["position"].get)
+    return [(idx["by_sku"][sku], orders[sku]) for sku in skus]
 
 def format_day_with_suffix(d):
     if 11 <= d.day <= 13:
@@ -297,10 +1110,11 @@ def display_full_date(d: date) -> str:
     except Exception:
         return d.isoformat()
 
-def git_push_file_if_possible(file_path: str, message: str):
+def git_push_files_if_possible(file_paths: list, message: str) -> bool:
+    """Commit and push file_paths. Returns True when the remote is up to date."""
     token = os.getenv("GITHUB_TOKEN")  # ✅ prevents NameError
     if not token:
-        return
+        return False
 
     try:
         # same lock so push/pull won't collide
@@ -313,37 +1127,43 @@ def git_push_file_if_possible(file_path: str, message: str):
 
             # If runtime doesn't include .git, persist via GitHub API.
             if not _repo_has_git():
-                _persist_push_fallback(file_path, message, GIT_BRANCH)
-                return
+                metrics_inc("redchurch_persist_fallback_total", reason="no_git")
+                return _persist_push_fallback_many(file_paths, message, GIT_BRANCH)
 
             _ensure_git_identity()
             _set_origin_with_token(token)
 
-            r_add = _git(["add", file_path])
+            r_add = _git(["add"] + list(file_paths))
             if r_add.returncode != 0:
-                print(f"[WARN] git add failed for {file_path}; using GitHub API fallback")
-                _persist_push_fallback(file_path, message, GIT_BRANCH)
-                return
+                print(f"[WARN] git add failed for {', '.join(file_paths)}; using GitHub API fallback")
+                metrics_inc("redchurch_persist_fallback_total", reason="git_add_failed")
+                return _persist_push_fallback_many(file_paths, message, GIT_BRANCH)
 
             # Only commit if there are changes
             status = _git(["status", "--porcelain"])
             if not status.stdout.strip():
-                return
+                metrics_inc("redchurch_persist_push_total", method="git", result="unchanged")
+                return True
 
             r_commit = _git(["commit", "-m", message])
             r_push = _git(["push", GIT_REMOTE, GIT_BRANCH])
 
             if r_push.returncode == 0:
-                print(f"[OK] Persisted {file_path} via git push")
-            else:
-                print(f"[WARN] git push failed for {file_path}; using GitHub API fallback")
-                _persist_push_fallback(file_path, message, GIT_BRANCH)
+                print(f"[OK] Persisted {', '.join(file_paths)} via git push")
+                metrics_inc("redchurch_persist_push_total", method="git", result="ok")
+                return True
+
+            print(f"[WARN] git push failed for {', '.join(file_paths)}; using GitHub API fallback")
+            metrics_inc("redchurch_persist_push_total", method="git", result="error")
+            metrics_inc("redchurch_persist_fallback_total", reason="git_push_failed")
+            return _persist_push_fallback_many(file_paths, message, GIT_BRANCH)
     except Exception as e:
         print(f"[WARN] git push failed: {e}; using GitHub API fallback")
+        metrics_inc("redchurch_persist_fallback_total", reason="exception")
         try:
-            _persist_push_fallback(file_path, message, GIT_BRANCH)
+            return _persist_push_fallback_many(file_paths, message, GIT_BRANCH)
         except Exception:
-            pass
+            return False
 
 def _to_bool(v, default=True):
     if isinstance(v, bool):
@@ -359,8 +1179,128 @@ def _to_bool(v, default=True):
         return False
     return default
 
-def load_pastry_prices():
-    path = _abs_path(PASTRY_PRICES_FILE)
+# -- Background persistence
+# Saves only enqueue the files they touched. One thread per worker waits
+# PERSIST_COALESCE_SECONDS for more saves to arrive, then pushes them all in one commit.
+# A failed push puts its files back in the queue and is retried with exponential backoff
+# (PERSIST_RETRY_SECONDS doubling up to PERSIST_RETRY_MAX_SECONDS), so a snapshot from a
+# compaction is never left behind a truncated journal on the remote.
+PERSIST_ASYNC = _to_bool(os.getenv("PERSIST_ASYNC"), default=True)
+PERSIST_COALESCE_SECONDS = float(os.getenv("PERSIST_COALESCE_SECONDS", "20"))
+PERSIST_RETRY_SECONDS = float(os.getenv("PERSIST_RETRY_SECONDS", "30"))
+PERSIST_RETRY_MAX_SECONDS = float(os.getenv("PERSIST_RETRY_MAX_SECONDS", "900"))
+
+_persist_cond = threading.Condition()
+_persist_pending = {}  # file -> None (insertion-ordered set)
+_persist_messages = []
+_persist_thread = None
+_persist_state = {
+    "in_flight": 0,
+    "pushes": 0,
+    "failures": 0,
+    "consecutive_failures": 0,
+    "last_success_at": None,
+    "last_failure_at": None,
+    "next_retry_at": None,
+}
+
+def persist_files(file_paths: list, message: str):
+    """Queue file_paths for the next push. Falls back to pushing inline when PERSIST_ASYNC is off."""
+    if not os.getenv("GITHUB_TOKEN"):
+        return False
+    if not PERSIST_ASYNC:
+        return git_push_files_if_possible(file_paths, message)
+
+    global _persist_thread
+    with _persist_cond:
+        for p in file_paths:
+            _persist_pending[p] = None
+        _persist_messages.append(message)
+
+        # Started lazily so it lives in the gunicorn worker, not a pre-fork parent.
+        if _persist_thread is None or not _persist_thread.is_alive():
+            _persist_thread = threading.Thread(target=_persist_worker, name="persist", daemon=True)
+            _persist_thread.start()
+        _persist_cond.notify()
+
+def _coalesced_message(messages: list) -> str:
+    unique = list(dict.fromkeys(messages))
+    if len(unique) == 1:
+        return unique[0]
+    return f"{unique[0]} (+{len(unique) - 1} more)\n\n" + "\n".join(unique)
+
+def _persist_retry_delay(consecutive_failures: int) -> float:
+    return min(PERSIST_RETRY_SECONDS * 2 ** (consecutive_failures - 1), PERSIST_RETRY_MAX_SECONDS)
+
+def _drain_persist_queue() -> bool:
+    """Push everything queued. On failure the files and messages go back in the queue."""
+    with _persist_cond:
+        files = list(_persist_pending)
+        messages = list(_persist_messages)
+        _persist_pending.clear()
+        _persist_messages.clear()
+        _persist_state["in_flight"] = len(files)
+    if not files:
+        return True
+
+    ok = False
+    try:
+        ok = git_push_files_if_possible(files, _coalesced_message(messages))
+    except Exception as e:
+        print(f"[WARN] Background persist failed: {e}")
+
+    with _persist_cond:
+        _persist_state["in_flight"] = 0
+        if ok:
+            _persist_state["pushes"] += 1
+            _persist_state["consecutive_failures"] = 0
+            _persist_state["next_retry_at"] = None
+            _persist_state["last_success_at"] = datetime.utcnow().isoformat() + "Z"
+        else:
+            _persist_state["failures"] += 1
+            _persist_state["consecutive_failures"] += 1
+            _persist_state["last_failure_at"] = datetime.utcnow().isoformat() + "Z"
+            delay = _persist_retry_delay(_persist_state["consecutive_failures"])
+            _persist_state["next_retry_at"] = (datetime.utcnow() + timedelta(seconds=delay)).isoformat() + "Z"
+            # Ahead of anything queued meanwhile, so the retry carries every unpushed file.
+            requeued = dict.fromkeys(files)
+            requeued.update(_persist_pending)
+            _persist_pending.clear()
+            _persist_pending.update(requeued)
+            _persist_messages[:0] = messages
+    return ok
+
+def _persist_worker():
+    delay = PERSIST_COALESCE_SECONDS
+    while True:
+        with _persist_cond:
+            while not _persist_pending:
+                _persist_cond.wait()
+        # Let the rest of a burst land before pushing (or back off after a failure).
+        time.sleep(delay)
+        if _drain_persist_queue():
+            delay = PERSIST_COALESCE_SECONDS
+        else:
+            with _persist_cond:
+                delay = _persist_retry_delay(_persist_state["consecutive_failures"])
+            print(f"[WARN] Persist push failed; retrying in {delay:.0f}s")
+
+def persist_status() -> dict:
+    with _persist_cond:
+        status = dict(_persist_state)
+        status["queue_depth"] = len(_persist_pending)
+        status["pending_files"] = list(_persist_pending)
+    status["async"] = PERSIST_ASYNC
+    status["coalesce_seconds"] = PERSIST_COALESCE_SECONDS
+    status["retry_seconds"] = PERSIST_RETRY_SECONDS
+    status["boot_sync"] = boot_sync_status()
+    return status
+
+# Push anything still queued when the worker shuts down.
+atexit.register(_drain_persist_queue)
+
+def _read_pastry_prices():
+    path = _abs_path(loc_file(PASTRY_PRICES_FILE))
     if not os.path.exists(path):
         return []
 
@@ -387,110 +1327,875 @@ def load_pastry_prices():
             })
     return cleaned
 
-def save_pastry_prices(items: list):
-    with open(_abs_path(PASTRY_PRICES_FILE), "w", encoding="utf-8") as f:
-        json.dump(items, f, indent=2, ensure_ascii=False)
-    git_push_file_if_possible(PASTRY_PRICES_FILE, "Update pastry prices")
+@timed
+def save_pastry_prices(items: list, history: list | None = None):
+    """Write the current price list; history records (see price_changes()) are appended first."""
+    files = [loc_file(PASTRY_PRICES_FILE)]
+    if history:
+        with open(_abs_path(loc_file(PASTRY_PRICE_HISTORY_FILE)), "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(rec, ensure_ascii=False) + "\n" for rec in history))
+            f.flush()
+            os.fsync(f.fileno())
+        files.append(loc_file(PASTRY_PRICE_HISTORY_FILE))
+
+    write_json_file(loc_file(PASTRY_PRICES_FILE), items)
+    if WASTE_BACKEND == "sqlite":
+        with _waste_db() as conn:
+            _waste_db_replace_prices(conn, items)
+            _waste_db_mark_synced(conn)
+    persist_files(files, "Update pastry prices")
+
+def _read_pastry_prices_db():
+    rows = _waste_db().execute("SELECT name, price, active FROM pastry_prices ORDER BY pos")
+    return [{"name": name, "price": round(price, 2), "active": bool(active)} for name, price, active in rows]
+
+@timed
+def load_pastry_prices():
+    if WASTE_BACKEND == "sqlite":
+        return cached_load("pastry_prices", [loc_tmp(WASTE_DB_PATH)], _read_pastry_prices_db)
+    return cached_load("pastry_prices", [loc_file(PASTRY_PRICES_FILE)], _read_pastry_prices)
 
-def pastry_items_and_price_map():
+def _build_pastry_price_map():
     items = load_pastry_prices()
     names = [x["name"] for x in items]
     price_map = {x["name"]: float(x["price"]) for x in items}
     return names, price_map
 
-def load_waste_logs():
-    path = _abs_path(WASTE_FILE)
+def pastry_items_and_price_map():
+    files = [loc_tmp(WASTE_DB_PATH)] if WASTE_BACKEND == "sqlite" else [loc_file(PASTRY_PRICES_FILE)]
+    return cached_load("pastry_price_map", files, _build_pastry_price_map)
+
+# -- PRICE HISTORY
+# PASTRY_PRICE_HISTORY_FILE holds one {"name", "price", "effective", "changed_at"} record
+# per change saved on the prices page. A record sets the price from "effective" onward
+# (null = since before the history starts), replacing anything appended earlier for
+# later dates, so a back-dated correction holds up to today. Entries without a stored unit_price are
+# costed at the price in effect on their own date, so a price edit doesn't rewrite old weeks.
+# Items with no history yet fall back to the current price list, as before.
+
+class PriceTimeline:
+    def __init__(self, records: list):
+        """records: (effective ordinal, name, price) in the order they were appended."""
+        self._series = {}  # name -> (array of effective ordinals, list of prices), ascending
+        for ordinal, name, price in records:
+            ordinals, prices = self._series.setdefault(name, (array("l"), []))
+            cut = bisect.bisect_left(ordinals, ordinal)
+            del ordinals[cut:]
+            del prices[cut:]
+            ordinals.append(ordinal)
+            prices.append(price)
+
+    def __contains__(self, name) -> bool:
+        return name in self._series
+
+    def names(self) -> list:
+        return list(self._series)
+
+    def price_on(self, name: str, ordinal: int):
+        """Price in effect on that day; before the first record, the earliest known price."""
+        series = self._series.get(name)
+        if series is None:
+            return None
+        i = bisect.bisect_right(series[0], ordinal) - 1
+        return series[1][max(i, 0)]
+
+    def prices_from(self, name: str, ordinal: int) -> set:
+        """Every price in effect from that day on."""
+        series = self._series.get(name)
+        if series is None:
+            return set()
+        i = bisect.bisect_right(series[0], ordinal) - 1
+        return set(series[1][max(i, 0):])
+
+    def changes(self, name: str) -> list:
+        ordinals, prices = self._series.get(name, ((), ()))
+        return [
+            {"effective": date.fromordinal(o).isoformat() if o > 1 else None, "price": p}
+            for o, p in zip(ordinals, prices)
+        ]
+
+def _read_price_timeline():
+    path = _abs_path(loc_file(PASTRY_PRICE_HISTORY_FILE))
+    records = []
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                    name = str(rec["name"])
+                    price = float(rec["price"])
+                except Exception:
+                    continue  # blank or torn line
+                d = parse_iso_date(rec.get("effective") or "")
+                records.append((d.toordinal() if d else 1, name, price))
+    return PriceTimeline(records)
+
+def load_price_timeline() -> PriceTimeline:
+    return cached_load("price_timeline", [loc_file(PASTRY_PRICE_HISTORY_FILE)], _read_price_timeline)
+
+def price_resolver(price_map: dict):
+    """(item, ordinal) -> fallback unit price for an entry on that day, or None if unknown."""
+    timeline = load_price_timeline()
+
+    def resolve(item: str, ordinal: int):
+        if item in timeline:
+            return timeline.price_on(item, ordinal)
+        p = price_map.get(item)
+        try:
+            return float(p) if p is not None else None
+        except Exception:
+            return None
+    return resolve
+
+def price_changes(old_items: list, new_items: list, effective: date) -> list:
+    """History records for a price list edit; an item's first change also records its old price."""
+    timeline = load_price_timeline()
+    old = {x["name"]: float(x["price"]) for x in old_items}
+    changed_at = datetime.utcnow().isoformat() + "Z"
+
+    records = []
+    for name, price in {x["name"]: float(x["price"]) for x in new_items}.items():
+        if name in timeline:
+            if timeline.prices_from(name, effective.toordinal()) == {price}:
+                continue
+        elif name in old:
+            if old[name] == price:
+                continue
+            records.append({"name": name, "price": old[name], "effective": None, "changed_at": changed_at})
+        records.append({"name": name, "price": price, "effective": effective.isoformat(), "changed_at": changed_at})
+    return records
+
+def _read_waste_snapshot():
+    path = _abs_path(loc_file(WASTE_FILE))
     if not os.path.exists(path):
         return {}
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
+def _read_waste_journal(f):
+    """Journal records in append order. A torn last line (worker killed mid-write) is skipped."""
+    records = []
+    for line in f:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            rec = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(rec, dict) and rec.get("date") and isinstance(rec.get("day"), dict):
+            records.append(rec)
+    return records
+
+def _read_waste_logs():
+    logs = _read_waste_snapshot()
+
+    path = _abs_path(loc_file(WASTE_JOURNAL_FILE))
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for rec in _read_waste_journal(f):
+                logs[rec["date"]] = rec["day"]
+    return logs
+
+@contextmanager
+def _waste_journal_locked():
+    """Open the journal with an exclusive flock; every writer of waste data goes through this."""
+    with open(_abs_path(loc_file(WASTE_JOURNAL_FILE)), "a+", encoding="utf-8") as journal:
+        fcntl.flock(journal, fcntl.LOCK_EX)
+        yield journal
+
+def _write_waste_snapshot(logs: dict):
+    # Durable before the caller truncates the journal, so a crash can't lose both.
+    write_json_file(loc_file(WASTE_FILE), logs)
+
+@timed
 def save_waste_logs(logs: dict, commit_message: str):
-    with open(_abs_path(WASTE_FILE), "w", encoding="utf-8") as f:
-        json.dump(logs, f, indent=2, ensure_ascii=False)
+    # Full rewrite: the snapshot now holds everything, so the journal starts over.
+    with _waste_journal_locked() as journal:
+        _write_waste_snapshot(logs)
+        journal.truncate(0)
+        if WASTE_BACKEND == "sqlite":
+            _waste_db_import(logs, None)
 
     try:
-        git_push_file_if_possible(WASTE_FILE, commit_message)
+        persist_files([loc_file(WASTE_FILE), loc_file(WASTE_JOURNAL_FILE)], commit_message)
     except Exception as e:
         print(f"[WARN] Could not push waste logs: {e}")
 
-def build_date_options(logs: dict, include_today: bool = True, limit: int = 60):
-    keys = []
-    for k in logs.keys():
-        if parse_iso_date(k):
-            keys.append(k)
-    keys = sorted(keys, reverse=True)
-
-    if include_today:
-        t = date.today().isoformat()
-        if t not in keys:
-            keys = [t] + keys
-
-    keys = keys[:limit]
-    opts = []
-    for iso in keys:
-        d = parse_iso_date(iso)
-        opts.append({"iso": iso, "label": display_full_date(d) if d else iso})
-    return opts
+@timed
+def save_waste_day(date_iso: str, day: dict, commit_message: str, base_version=None):
+    """
+    Append one day's record to the journal instead of rewriting the whole history.
+    Every WASTE_JOURNAL_COMPACT_EVERY records the journal is compacted into WASTE_FILE.
 
-# -- WEEKLY SUMMARY HELPERS
-def aggregate_week(logs: dict, start_date: date, current_price_map: dict):
-    total_qty = 0
-    total_cost = 0.0
-    item_map = {}   # item -> {qty, cost}
-    daily = []      # [{label, iso, qty, cost}]
-    unknown_price_items = set()
+    With base_version the day is only replaced if the stored day is still at that version;
+    otherwise nothing is written and the stored day comes back. Returns None once saved.
+    """
+    if base_version is None:
+        save_waste_days({date_iso: day}, commit_message)
+        return None
+    with _waste_journal_locked() as journal:
+        current = current_waste_day(date_iso, journal) or {"date": date_iso, "entries": []}
+        if base_version != current.get("version", 0):
+            return current
+        compacted = _append_waste_days_locked(journal, {date_iso: day})
+    _persist_waste_days(compacted, commit_message)
+    return None
+
+@timed
+def save_waste_days(days: dict, commit_message: str):
+    """save_waste_day() for several days at once: one journal write, one fsync, one push."""
+    if not days:
+        return
+    with _waste_journal_locked() as journal:
+        compacted = _append_waste_days_locked(journal, days)
+    _persist_waste_days(compacted, commit_message)
 
-    for i in range(7):
-        d = start_date + timedelta(days=i)
-        iso = d.isoformat()
+def current_waste_day(date_iso: str, journal=None):
+    """
+    The stored day with its entry ids and version, or None. Writers pass the journal they
+    hold locked: the day then comes from the journal or the cached snapshot store, without
+    splicing a fresh copy of the whole store.
+    """
+    if WASTE_BACKEND == "sqlite":
+        return _waste_db_days("WHERE date = ?", (date_iso,)).get(date_iso)
+    if journal is None:
+        return load_waste_store().day(date_iso)
+
+    journal.seek(0)
+    day = None
+    for rec in _read_waste_journal(journal):
+        if rec["date"] == date_iso:
+            day = rec["day"]
+    if day is not None:
+        return WasteStore.from_logs({date_iso: day}).day(date_iso)
+    return _waste_snapshot_store().day(date_iso)
+
+def _append_waste_days_locked(journal, days: dict) -> bool:
+    """Journal days (each gets the next version). Caller holds the lock. True if compacted."""
+    for iso, day in days.items():
+        day["version"] = (current_waste_day(iso, journal) or {}).get("version", 0) + 1
+
+    line = "".join(json.dumps({"date": iso, "day": day}, ensure_ascii=False) + "\n" for iso, day in days.items())
+    compacted = False
+
+    signature_before = _waste_source_signature()
+    journal.seek(0)
+    existing = journal.read()
+    if existing and not existing.endswith("\n"):
+        # Don't glue this record onto a torn one.
+        line = "\n" + line
+
+    journal.write(line)
+    journal.flush()
+    os.fsync(journal.fileno())
+
+    records = _read_waste_journal((existing + line).splitlines())
+    if len(records) >= WASTE_JOURNAL_COMPACT_EVERY:
+        _compact_waste_journal(records, journal)
+        compacted = True
+
+    if WASTE_BACKEND == "sqlite":
+        with _waste_db() as conn:
+            for iso, day in days.items():
+                _waste_db_replace_day(conn, iso, day)
+            _waste_db_mark_synced(conn)
+
+    _update_waste_rollups(days, signature_before)
+    return compacted
+
+def _persist_waste_days(compacted: bool, commit_message: str):
+    files = [loc_file(WASTE_FILE), loc_file(WASTE_JOURNAL_FILE)] if compacted else [loc_file(WASTE_JOURNAL_FILE)]
+    try:
+        persist_files(files, commit_message)
+    except Exception as e:
+        print(f"[WARN] Could not push waste logs: {e}")
 
-        day_entries = []
-        if isinstance(logs.get(iso, {}), dict):
-            day_entries = (logs.get(iso, {}) or {}).get("entries", []) or []
+@timed
+def patch_waste_day(date_iso: str, base_version, ops: list, commit_message: str):
+    """
+    Apply entry ops from clean_waste_ops() to one day under the journal lock.
 
-        day_qty = 0
-        day_cost = 0.0
+    Adds always apply. Updates and deletes need base_version to be the stored version, so
+    two devices editing the same day can't silently overwrite each other; otherwise nothing
+    is written and (None, None, current_day) comes back. On success returns
+    (day, {"renamed": {client_id: id}, "added": [id, ...]}, None). Entries saved before ids
+    existed are addressed as "p<position>" and get a real id on their first patch.
+    """
+    with _waste_journal_locked() as journal:
+        current = current_waste_day(date_iso, journal) or {"date": date_iso, "entries": []}
+        if not ops:
+            return current, {"renamed": {}, "added": []}, None
+        if base_version != current.get("version", 0) and any(op["op"] != "add" for op in ops):
+            return None, None, current
+
+        entries = []
+        by_id = {}
+        renamed = {}
+        for pos, e in enumerate(current.get("entries", [])):
+            entry_id = e.get("id")
+            if not entry_id:
+                entry_id = renamed[f"p{pos}"] = new_waste_entry_id()
+            e = {"id": entry_id, **{k: v for k, v in e.items() if k != "id"}}
+            entries.append(e)
+            by_id[entry_id] = e
+            if f"p{pos}" in renamed:
+                by_id[f"p{pos}"] = e
+
+        added = []
+        deleted = set()
+        for op in ops:
+            if op["op"] == "add":
+                e = {"id": new_waste_entry_id(), **op["entry"]}
+                entries.append(e)
+                added.append(e["id"])
+                continue
 
-        for e in day_entries:
-            item = str(e.get("item", "")).strip()
+            e = by_id.get(op["id"])
+            if op["op"] == "delete":
+                if e is not None:  # already gone is fine
+                    deleted.add(e["id"])
+            elif e is None or e["id"] in deleted:
+                return None, None, current
+            else:
+                e.update(op["entry"])
+
+        day = {
+            "date": date_iso,
+            "entries": [e for e in entries if e["id"] not in deleted],
+            "updated_at": datetime.utcnow().isoformat() + "Z",
+        }
+        compacted = _append_waste_days_locked(journal, {date_iso: day})
+
+    _persist_waste_days(compacted, commit_message)
+    return day, {"renamed": renamed, "added": added}, None
+
+def _compact_waste_journal(records: list, journal):
+    # Caller holds the journal lock.
+    logs = _read_waste_snapshot()
+    for rec in records:
+        logs[rec["date"]] = rec["day"]
+    _write_waste_snapshot(logs)
+    journal.truncate(0)
+
+def compact_waste_journal():
+    with _waste_journal_locked() as journal:
+        journal.seek(0)
+        records = _read_waste_journal(journal)
+        if not records:
+            return 0
+        _compact_waste_journal(records, journal)
+    return len(records)
+
+# -- SQLITE STORAGE
+_waste_db_local = threading.local()
+
+WASTE_DB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS waste_days (
+    date TEXT PRIMARY KEY,
+    updated_at TEXT,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS waste_entries (
+    id INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    pos INTEGER NOT NULL,
+    item TEXT NOT NULL,
+    qty INTEGER NOT NULL,
+    reason TEXT NOT NULL,
+    unit_price REAL,
+    entry_id TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_waste_entries_date ON waste_entries (date);
+CREATE INDEX IF NOT EXISTS idx_waste_entries_item_date ON waste_entries (item, date);
+CREATE INDEX IF NOT EXISTS idx_waste_entries_reason_date ON waste_entries (reason, date);
+CREATE TABLE IF NOT EXISTS pastry_prices (
+    pos INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    price REAL NOT NULL,
+    active INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+def _waste_db():
+    """Per-thread connection to this location's database; `with _waste_db() as conn:` for a transaction."""
+    conns = getattr(_waste_db_local, "conns", None)
+    if conns is None:
+        conns = _waste_db_local.conns = {}
+    path = loc_tmp(WASTE_DB_PATH)
+    conn = conns.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=30)
+        conn.executescript(WASTE_DB_SCHEMA)
+        _waste_db_add_missing_columns(conn)
+        conns[path] = conn
+    return conn
+
+def _waste_db_add_missing_columns(conn):
+    # Databases created before entry ids/day versions existed.
+    for table, column, decl in (
+        ("waste_days", "version", "INTEGER NOT NULL DEFAULT 0"),
+        ("waste_entries", "entry_id", "TEXT"),
+    ):
+        columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+        if column not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+    conn.commit()
+
+def _waste_source_signature() -> str:
+    """Identifies the JSON files the database was last synced with."""
+    return json.dumps([
+        _file_signature(loc_file(f)) for f in (WASTE_FILE, WASTE_JOURNAL_FILE, PASTRY_PRICES_FILE, PASTRY_PRICE_HISTORY_FILE)
+    ])
+
+def _waste_db_mark_synced(conn):
+    conn.execute(
+        "INSERT OR REPLACE INTO meta (key, value) VALUES ('source_signature', ?)",
+        (_waste_source_signature(),),
+    )
+
+def _waste_db_replace_day(conn, date_iso: str, day: dict):
+    conn.execute("DELETE FROM waste_entries WHERE date = ?", (date_iso,))
+    try:
+        version = int(day.get("version") or 0)
+    except Exception:
+        version = 0
+    conn.execute(
+        "INSERT OR REPLACE INTO waste_days (date, updated_at, version) VALUES (?, ?, ?)",
+        (date_iso, day.get("updated_at"), version),
+    )
+
+    rows = []
+    for pos, e in enumerate(day.get("entries", []) or []):
+        if not isinstance(e, dict):
+            continue
+        try:
+            qty = int(e.get("qty", 0))
+        except Exception:
+            qty = 0
+        unit_price = _stored_unit_price(e)
+        rows.append((
+            date_iso,
+            pos,
+            str(e.get("item", "")).strip(),
+            qty,
+            str(e.get("reason", "")).strip(),
+            unit_price,
+            e.get("id") if _waste_entry_id_int(e.get("id")) else None,
+        ))
+    conn.executemany(
+        "INSERT INTO waste_entries (date, pos, item, qty, reason, unit_price, entry_id) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        rows,
+    )
+
+def _waste_db_replace_prices(conn, items: list):
+    conn.execute("DELETE FROM pastry_prices")
+    conn.executemany(
+        "INSERT INTO pastry_prices (name, pos, price, active) VALUES (?, ?, ?, ?)",
+        [(x["name"], pos, float(x["price"]), 1 if x.get("active", True) else 0) for pos, x in enumerate(items)],
+    )
+
+def _waste_db_import(logs: dict, prices):
+    with _waste_db() as conn:
+        conn.execute("DELETE FROM waste_entries")
+        conn.execute("DELETE FROM waste_days")
+        for date_iso, day in logs.items():
+            if isinstance(day, dict):
+                _waste_db_replace_day(conn, date_iso, day)
+        if prices is not None:
+            _waste_db_replace_prices(conn, prices)
+        _waste_db_mark_synced(conn)
+
+def _waste_db_days(where: str = "", params: tuple = ()) -> dict:
+    conn = _waste_db()
+    logs = {}
+    for date_iso, updated_at, version in conn.execute(
+        f"SELECT date, updated_at, version FROM waste_days {where} ORDER BY date", params
+    ):
+        logs[date_iso] = {"date": date_iso, "entries": [], "updated_at": updated_at}
+        if version:
+            logs[date_iso]["version"] = version
+
+    for date_iso, item, qty, reason, unit_price, entry_id in conn.execute(
+        f"SELECT date, item, qty, reason, unit_price, entry_id FROM waste_entries {where} ORDER BY date, pos", params
+    ):
+        day = logs.setdefault(date_iso, {"date": date_iso, "entries": []})
+        entry = {"item": item, "qty": qty, "reason": reason, "unit_price": unit_price}
+        if entry_id:
+            entry = {"id": entry_id, **entry}
+        day["entries"].append(entry)
+    return logs
+
+def migrate_waste_json_to_sqlite():
+    """One-shot import of waste_logs.json (+ journal) and pastry_prices.json into WASTE_DB_PATH."""
+    with _waste_journal_locked():
+        logs = _read_waste_logs()
+        _waste_db_import(logs, _read_pastry_prices())
+    return len(logs)
+
+def export_waste_sqlite_to_json(commit_message: str = "Export waste logs from SQLite"):
+    """Write the database back out as waste_logs.json (journal emptied) and push it."""
+    with _waste_journal_locked() as journal:
+        logs = _waste_db_days()
+        _write_waste_snapshot(logs)
+        journal.truncate(0)
+        with _waste_db() as conn:
+            _waste_db_mark_synced(conn)
+
+    persist_files([loc_file(WASTE_FILE), loc_file(WASTE_JOURNAL_FILE)], commit_message)
+    return len(logs)
+
+def ensure_waste_db():
+    """Re-import when the JSON files changed underneath the database (boot pull, fresh disk)."""
+    row = _waste_db().execute("SELECT value FROM meta WHERE key = 'source_signature'").fetchone()
+    if row is None or row[0] != _waste_source_signature():
+        n = migrate_waste_json_to_sqlite()
+        print(f"[OK] Imported {n} waste log days into {loc_tmp(WASTE_DB_PATH)}")
+
+# -- WASTE STORE
+# Resident form of the waste history. Item and reason names are interned to small ints and
+# entries sit in array-backed columns grouped by day in date order, so a worker holding
+# years of history keeps a handful of arrays instead of a dict (and strings) per entry.
+# Values are coerced once on load with the same rules the aggregations used per entry.
+NAN = float("nan")
+
+def new_waste_entry_id() -> str:
+    # 63 random bits, so WasteStore can keep ids in a signed 64-bit column.
+    return f"{uuid.uuid4().int >> 65:016x}"
+
+def _waste_entry_id_int(v) -> int:
+    """Numeric form of an id from new_waste_entry_id(); 0 if v isn't one."""
+    if not isinstance(v, str) or len(v) != 16:
+        return 0
+    try:
+        n = int(v, 16)
+    except ValueError:
+        return 0
+    return n if 0 < n < 2 ** 63 else 0
+
+def _stored_unit_price(e: dict):
+    """
+    An entry's stored unit_price as a float, or None when it's missing or unparseable.
+    Every reader treats None the same way: the price timeline for the entry's date applies.
+    """
+    unit_price = e.get("unit_price", None)
+    if unit_price is None:
+        return None
+    try:
+        unit_price = float(unit_price)
+    except (TypeError, ValueError):
+        return None
+    return None if unit_price != unit_price else unit_price
+
+class WasteStore:
+    def __init__(self):
+        self.item_names = []
+        self.reason_names = []
+        self._item_ids = {}
+        self._reason_ids = {}
+        self.day_ordinal = array("l")  # date.toordinal() per logged day, ascending
+        self.day_offset = array("l", [0])  # day i owns entries [day_offset[i], day_offset[i + 1])
+        self.day_updated_at = []
+        self.day_version = array("l")  # 0 = never versioned (saved before entry ids existed)
+        self.entry_id = array("q")  # 0 = no id yet
+        self.item = array("l")
+        self.reason = array("l")
+        self.qty = array("q")
+        self.unit_price = array("d")  # NaN = no stored price
+
+    @classmethod
+    def from_logs(cls, logs: dict) -> "WasteStore":
+        days = []
+        for iso, day in logs.items():
+            d = parse_iso_date(iso)
+            if d and isinstance(day, dict):
+                days.append((d.toordinal(), day))
+        days.sort(key=lambda x: x[0])
+
+        store = cls()
+        for ordinal, day in days:
+            store._append_day(ordinal, day)
+        return store
+
+    @staticmethod
+    def _intern(ids: dict, names: list, name: str) -> int:
+        i = ids.get(name)
+        if i is None:
+            i = ids[name] = len(names)
+            names.append(name)
+        return i
+
+    def _append_day(self, ordinal: int, day: dict):
+        for e in day.get("entries", []) or []:
+            if not isinstance(e, dict):
+                continue
             try:
                 qty = int(e.get("qty", 0))
             except Exception:
                 qty = 0
-
-            unit_price = e.get("unit_price", None)
+            unit_price = _stored_unit_price(e)
             if unit_price is None:
-                unit_price = current_price_map.get(item)
+                unit_price = NAN
 
-            try:
-                unit_price = float(unit_price) if unit_price is not None else None
-            except Exception:
-                unit_price = None
+            self.entry_id.append(_waste_entry_id_int(e.get("id")))
+            self.item.append(self._intern(self._item_ids, self.item_names, str(e.get("item", "")).strip()))
+            self.reason.append(self._intern(self._reason_ids, self.reason_names, str(e.get("reason", "")).strip()))
+            self.qty.append(qty)
+            self.unit_price.append(unit_price)
 
-            if unit_price is None:
-                unknown_price_items.add(item)
+        self.day_ordinal.append(ordinal)
+        self.day_offset.append(len(self.item))
+        self.day_updated_at.append(day.get("updated_at"))
+        try:
+            self.day_version.append(max(0, int(day.get("version") or 0)))
+        except Exception:
+            self.day_version.append(0)
+
+    def _extend_days(self, src: "WasteStore", lo: int, hi: int):
+        """Copy src's days [lo, hi) onto the end of this store (name tables must match)."""
+        if lo >= hi:
+            return
+        a, b = src.day_offset[lo], src.day_offset[hi]
+        shift = len(self.item) - a
+        self.day_ordinal.extend(src.day_ordinal[lo:hi])
+        self.day_offset.extend(o + shift for o in src.day_offset[lo + 1:hi + 1])
+        self.day_updated_at.extend(src.day_updated_at[lo:hi])
+        self.day_version.extend(src.day_version[lo:hi])
+        self.entry_id.extend(src.entry_id[a:b])
+        self.item.extend(src.item[a:b])
+        self.reason.extend(src.reason[a:b])
+        self.qty.extend(src.qty[a:b])
+        self.unit_price.extend(src.unit_price[a:b])
+
+    def replace_days(self, logs: dict) -> "WasteStore":
+        """A new store with these days (shaped like waste_logs.json) added or replacing ours."""
+        days = []
+        for iso, day in logs.items():
+            d = parse_iso_date(iso)
+            if d and isinstance(day, dict):
+                days.append((d.toordinal(), day))
+        days.sort(key=lambda x: x[0])
+
+        out = WasteStore()
+        out.item_names, out._item_ids = list(self.item_names), dict(self._item_ids)
+        out.reason_names, out._reason_ids = list(self.reason_names), dict(self._reason_ids)
+        pos = 0
+        for ordinal, day in days:
+            cut = bisect.bisect_left(self.day_ordinal, ordinal, pos)
+            out._extend_days(self, pos, cut)
+            out._append_day(ordinal, day)
+            pos = cut + 1 if cut < len(self.day_ordinal) and self.day_ordinal[cut] == ordinal else cut
+        out._extend_days(self, pos, len(self.day_ordinal))
+        return out
+
+    def __len__(self):
+        return len(self.item)
+
+    def dates(self) -> list:
+        return [date.fromordinal(o).isoformat() for o in self.day_ordinal]
+
+    def has_day(self, d: date) -> bool:
+        lo, hi = self.day_range(d, d)
+        return lo < hi
+
+    def dates_between(self, start_date: date, end_date: date) -> list:
+        lo, hi = self.day_range(start_date, end_date)
+        return [date.fromordinal(o) for o in self.day_ordinal[lo:hi]]
+
+    def dates_before(self, before: date | None = None, limit: int = 60):
+        """
+        Up to limit logged dates strictly before `before` (default: the newest), newest
+        first, plus the cursor for the next page (the oldest date returned) or None.
+        """
+        hi = len(self.day_ordinal) if before is None else bisect.bisect_left(self.day_ordinal, before.toordinal())
+        lo = max(0, hi - max(0, limit))
+        out = [date.fromordinal(o) for o in reversed(self.day_ordinal[lo:hi])]
+        return out, (out[-1] if lo > 0 and out else None)
+
+    def day_range(self, start_date: date, end_date: date):
+        """Indices [lo, hi) of the logged days between start_date and end_date inclusive."""
+        lo = bisect.bisect_left(self.day_ordinal, start_date.toordinal())
+        hi = bisect.bisect_right(self.day_ordinal, end_date.toordinal(), lo)
+        return lo, hi
+
+    def entries(self, start_date: date, end_date: date):
+        """(ordinal, item_id, reason_id, qty, unit_price or None) per entry, in date order."""
+        lo, hi = self.day_range(start_date, end_date)
+        ordinals, offsets = self.day_ordinal, self.day_offset
+        items, reasons, qtys, prices = self.item, self.reason, self.qty, self.unit_price
+        for di in range(lo, hi):
+            ordinal = ordinals[di]
+            for j in range(offsets[di], offsets[di + 1]):
+                p = prices[j]
+                yield ordinal, items[j], reasons[j], qtys[j], (None if p != p else p)
+
+    def to_logs(self, start_date: date | None = None, end_date: date | None = None) -> dict:
+        """The days in [start_date, end_date] (default: all) shaped like waste_logs.json."""
+        lo, hi = (0, len(self.day_ordinal)) if start_date is None else self.day_range(start_date, end_date)
+        logs = {}
+        for di in range(lo, hi):
+            iso = date.fromordinal(self.day_ordinal[di]).isoformat()
+            entries = []
+            for j in range(self.day_offset[di], self.day_offset[di + 1]):
+                p = self.unit_price[j]
+                entry = {
+                    "item": self.item_names[self.item[j]],
+                    "qty": self.qty[j],
+                    "reason": self.reason_names[self.reason[j]],
+                    "unit_price": None if p != p else p,
+                }
+                if self.entry_id[j]:
+                    entry = {"id": f"{self.entry_id[j]:016x}", **entry}
+                entries.append(entry)
+            day = {"date": iso, "entries": entries}
+            if self.day_updated_at[di] is not None:
+                day["updated_at"] = self.day_updated_at[di]
+            if self.day_version[di]:
+                day["version"] = self.day_version[di]
+            logs[iso] = day
+        return logs
+
+    def version_of(self, iso: str) -> int:
+        d = parse_iso_date(iso)
+        if not d:
+            return 0
+        lo, hi = self.day_range(d, d)
+        return self.day_version[lo] if lo < hi else 0
+
+    def day(self, iso: str):
+        d = parse_iso_date(iso)
+        if not d:
+            return None
+        return self.to_logs(d, d).get(d.isoformat())
+
+def _waste_snapshot_store() -> WasteStore:
+    return cached_load("waste_snapshot_store", [loc_file(WASTE_FILE)], lambda: WasteStore.from_logs(_read_waste_snapshot()))
+
+def _read_waste_store():
+    if WASTE_BACKEND == "sqlite":
+        return WasteStore.from_logs(_waste_db_days())
+
+    # The snapshot only changes on compaction; between compactions a save just splices the
+    # journal's days into a copy of it instead of re-parsing the whole history.
+    base = _waste_snapshot_store()
+    journal_days = {}
+    path = _abs_path(loc_file(WASTE_JOURNAL_FILE))
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for rec in _read_waste_journal(f):
+                journal_days[rec["date"]] = rec["day"]
+    return base.replace_days(journal_days) if journal_days else base
+
+@timed
+def load_waste_store() -> WasteStore:
+    files = [loc_tmp(WASTE_DB_PATH)] if WASTE_BACKEND == "sqlite" else [loc_file(WASTE_FILE), loc_file(WASTE_JOURNAL_FILE)]
+    return cached_load("waste_store", files, _read_waste_store)
+
+@timed
+def load_waste_range(start_date: date, end_date: date) -> dict:
+    """Waste log days between start_date and end_date inclusive, shaped like WasteStore.to_logs()."""
+    if WASTE_BACKEND == "sqlite":
+        return _waste_db_days("WHERE date BETWEEN ? AND ?", (start_date.isoformat(), end_date.isoformat()))
+
+    return load_waste_store().to_logs(start_date, end_date)
+
+def load_waste_store_range(start_date: date, end_date: date) -> WasteStore:
+    """
+    A WasteStore holding at least [start_date, end_date]. For SQLite that is just the range
+    (a BETWEEN query, so a save doesn't cost a whole-history reload); for JSON the resident store.
+    """
+    if WASTE_BACKEND == "sqlite":
+        return WasteStore.from_logs(load_waste_range(start_date, end_date))
+    return load_waste_store()
 
-            cost = (qty * unit_price) if unit_price is not None else 0.0
+if WASTE_BACKEND == "sqlite":
+    for _loc in LOCATIONS.values():
+        with using_location(_loc):
+            ensure_waste_db()
 
-            total_qty += qty
-            total_cost += cost
-            day_qty += qty
-            day_cost += cost
+WASTE_DATE_PAGE_MAX = 366
 
-            it = item_map.setdefault(item, {"qty": 0, "cost": 0.0})
-            it["qty"] += qty
-            it["cost"] += cost
+def build_date_options(store: WasteStore, include_today: bool = True, limit: int = 60, before: date | None = None):
+    """
+    One page of the /waste date picker, newest first, read off the store's sorted day index
+    (cost doesn't depend on how much history there is). Returns (options, next_before):
+    pass next_before back as `before` for the following page; None means no older days.
+    The first page (before=None) starts with today even if nothing is logged yet.
+    """
+    days = []
+    if include_today and before is None:
+        today = date.today()
+        if not store.has_day(today):
+            days.append(today)
+            limit -= 1
+
+    older, next_before = store.dates_before(before, limit)
+    if limit <= 0 and days and store.dates_before(days[0], 1)[0]:
+        next_before = days[0]  # today filled the page; older days start below it
+    days += older
+    opts = [{"iso": d.isoformat(), "label": display_full_date(d)} for d in days]
+    return opts, (next_before.isoformat() if next_before else None)
+
+# -- WEEKLY SUMMARY HELPERS
+def aggregate_week(logs, start_date: date, current_price_map: dict):
+    """Week summary from a WasteStore, or from a logs dict (only that week's days are read)."""
+    end_date = start_date + timedelta(days=6)
+    if isinstance(logs, WasteStore):
+        store = logs
+    else:
+        week = {}
+        for i in range(7):
+            iso = (start_date + timedelta(days=i)).isoformat()
+            if iso in logs:
+                week[iso] = logs[iso]
+        store = WasteStore.from_logs(week)
+
+    fallback = price_resolver(current_price_map)
+    names = store.item_names
+    start_ord = start_date.toordinal()
+    day_totals = [[0, 0.0] for _ in range(7)]
+    totals_by_id = {}  # item id -> [qty, cost]
+    unknown_ids = set()
+    total_qty = 0
+    total_cost = 0.0
+
+    for ordinal, item, _, qty, unit_price in store.entries(start_date, end_date):
+        if unit_price is None:
+            unit_price = fallback(names[item], ordinal)
+        if unit_price is None:
+            unknown_ids.add(item)
 
+        cost = (qty * unit_price) if unit_price is not None else 0.0
+
+        total_qty += qty
+        total_cost += cost
+        day = day_totals[ordinal - start_ord]
+        day[0] += qty
+        day[1] += cost
+
+        it = totals_by_id.setdefault(item, [0, 0.0])
+        it[0] += qty
+        it[1] += cost
+
+    daily = []      # [{label, iso, qty, cost}]
+    for i, (day_qty, day_cost) in enumerate(day_totals):
+        d = start_date + timedelta(days=i)
         daily.append(
             {
-                "iso": iso,
+                "iso": d.isoformat(),
                 "label": display_full_date(d),
                 "qty": day_qty,
                 "cost": round(day_cost, 2),
             }
         )
 
+    item_map = {names[i]: {"qty": v[0], "cost": v[1]} for i, v in totals_by_id.items()}
+    unknown_price_items = {names[i] for i in unknown_ids}
+
     items = [
         {"item": k, "qty": v["qty"], "cost": round(v["cost"], 2)}
         for k, v in item_map.items()
@@ -509,85 +2214,70 @@ def aggregate_week(logs: dict, start_date: date, current_price_map: dict):
 
 def weekly_waste_aggregate_for_export(start_date: date):
     """
-    Collect ONLY days in the week that actually logged waste entries (and qty > 0).
-    Uses stored unit_price if present; falls back to current pastry_prices.json mapping.
+    Collect ONLY days in the week that actually logged waste entries (and qty > 0), read
+    from the waste store (load_waste_store_range()). Uses the entry's stored unit_price if
+    present; otherwise price_resolver() gives the price in effect on that day from the
+    price history (PriceTimeline), then the current pastry_prices.json price.
     """
-    logs = load_waste_logs()
+    end_date = start_date + timedelta(days=6)
+    store = load_waste_store_range(start_date, end_date)
     _, price_map = pastry_items_and_price_map()
+    fallback = price_resolver(price_map)
+    item_names, reason_names = store.item_names, store.reason_names
 
     daily_rows = []        # days with logged waste
     item_totals = {}       # item -> {qty, cost}
     raw_entries = []       # flat list for Entries sheet
     missing_price_items = set()
 
-    for i in range(7):
-        d = start_date + timedelta(days=i)
-        iso = d.isoformat()
-        weekday = d.strftime("%A")
-
-        day_obj = logs.get(iso, {})
-        day_entries = (day_obj.get("entries", []) if isinstance(day_obj, dict) else []) or []
-
-        day_qty = 0
-        day_cost = 0.0
+    by_day = {}            # ordinal -> [qty, cost, iso, weekday], in date order
+    for ordinal, item_id, reason_id, qty, unit_price in store.entries(start_date, end_date):
+        item = item_names[item_id]
+        if not item or qty <= 0:
+            continue
 
-        for e in day_entries:
-            item = str(e.get("item", "")).strip()
-            reason = str(e.get("reason", "")).strip() or "Other"
+        if unit_price is None:
+            unit_price = fallback(item, ordinal)
+        if unit_price is None:
+            missing_price_items.add(item)
 
-            try:
-                qty = int(e.get("qty", 0))
-            except Exception:
-                qty = 0
+        cost = (qty * unit_price) if unit_price is not None else 0.0
 
-            if not item or qty <= 0:
-                continue
+        day = by_day.get(ordinal)
+        if day is None:
+            d = date.fromordinal(ordinal)
+            day = by_day[ordinal] = [0, 0.0, d.isoformat(), d.strftime("%A")]
+        day[0] += qty
+        day[1] += cost
 
-            unit_price = e.get("unit_price", None)
-            if unit_price is None:
-                unit_price = price_map.get(item)
+        it = item_totals.setdefault(item, {"qty": 0, "cost": 0.0})
+        it["qty"] += qty
+        it["cost"] += cost
 
-            try:
-                unit_price = float(unit_price) if unit_price is not None else None
-            except Exception:
-                unit_price = None
+        raw_entries.append({
+            "date": day[2],
+            "day": day[3],
+            "item": item,
+            "reason": reason_names[reason_id] or "Other",
+            "qty": qty,
+            "unit_price": unit_price,
+            "cost": round(cost, 2),
+        })
 
-            if unit_price is None:
-                missing_price_items.add(item)
+    # IMPORTANT: only include days that actually logged any waste
+    for day_qty, day_cost, iso, weekday in by_day.values():
+        daily_rows.append({
+            "date": iso,
+            "day": weekday,
+            "qty": day_qty,
+            "cost": round(day_cost, 2),
+        })
 
-            cost = (qty * unit_price) if unit_price is not None else 0.0
+    items_sorted = [{"item": k, "qty": v["qty"], "cost": round(v["cost"], 2)} for k, v in item_totals.items()]
+    items_sorted.sort(key=lambda x: (x["cost"], x["qty"]), reverse=True)
 
-            day_qty += qty
-            day_cost += cost
-
-            it = item_totals.setdefault(item, {"qty": 0, "cost": 0.0})
-            it["qty"] += qty
-            it["cost"] += cost
-
-            raw_entries.append({
-                "date": iso,
-                "day": weekday,
-                "item": item,
-                "reason": reason,
-                "qty": qty,
-                "unit_price": unit_price,
-                "cost": round(cost, 2),
-            })
-
-        # IMPORTANT: only include days that actually logged any waste
-        if day_qty > 0:
-            daily_rows.append({
-                "date": iso,
-                "day": weekday,
-                "qty": day_qty,
-                "cost": round(day_cost, 2),
-            })
-
-    items_sorted = [{"item": k, "qty": v["qty"], "cost": round(v["cost"], 2)} for k, v in item_totals.items()]
-    items_sorted.sort(key=lambda x: (x["cost"], x["qty"]), reverse=True)
-
-    total_qty = sum(r["qty"] for r in daily_rows)
-    total_cost = round(sum(r["cost"] for r in daily_rows), 2)
+    total_qty = sum(r["qty"] for r in daily_rows)
+    total_cost = round(sum(r["cost"] for r in daily_rows), 2)
 
     return {
         "daily": daily_rows,
@@ -599,101 +2289,653 @@ def weekly_waste_aggregate_for_export(start_date: date):
     }
 
 
+# -- RANGE ANALYTICS
+WASTE_RANGE_GROUPS = ("day", "week", "month", "quarter", "year", "item", "reason")
+WASTE_RANGE_MAX_DAYS = 3660  # ten years; time groups get one bucket per period in the span
+
+def _period_key(d: date, group: str) -> str:
+    if group == "day":
+        return d.isoformat()
+    if group == "week":
+        return monday_of_week(d).isoformat()
+    if group == "month":
+        return f"{d.year}-{d.month:02d}"
+    if group == "quarter":
+        return f"{d.year}-Q{(d.month - 1) // 3 + 1}"
+    return str(d.year)
+
+def aggregate_waste_range(start_date: date, end_date: date, group: str, price_map: dict) -> dict:
+    """
+    One pass over [start_date, end_date] grouped by a time period, item or reason.
+    Returns columnar arrays (keys, qty, cost) ready for charting; time groups include
+    empty periods so the x-axis has no gaps. Spans longer than WASTE_RANGE_MAX_DAYS raise
+    ValueError.
+    """
+    if (end_date - start_date).days + 1 > WASTE_RANGE_MAX_DAYS:
+        raise ValueError(f"Range is limited to {WASTE_RANGE_MAX_DAYS} days")
+
+    buckets = {}  # key -> [qty, cost]
+    if group not in ("item", "reason"):
+        # Walk ordinals, not dates, so a range ending on date.max doesn't overflow.
+        for ordinal in range(start_date.toordinal(), end_date.toordinal() + 1):
+            buckets.setdefault(_period_key(date.fromordinal(ordinal), group), [0, 0.0])
+
+    store = load_waste_store_range(start_date, end_date)
+    fallback = price_resolver(price_map)
+    item_names, reason_names = store.item_names, store.reason_names
+    total_qty = 0
+    total_cost = 0.0
+    unknown_ids = set()
+
+    period_of = {}  # ordinal -> period key
+    for ordinal, item_id, reason_id, qty, unit_price in store.entries(start_date, end_date):
+        if unit_price is None:
+            unit_price = fallback(item_names[item_id], ordinal)
+            if unit_price is None:
+                unknown_ids.add(item_id)
+        cost = (qty * unit_price) if unit_price is not None else 0.0
+
+        if group == "item":
+            key = item_names[item_id]
+            if not key:
+                continue
+        elif group == "reason":
+            key = reason_names[reason_id] or "Other"
+        else:
+            key = period_of.get(ordinal)
+            if key is None:
+                key = period_of[ordinal] = _period_key(date.fromordinal(ordinal), group)
+
+        b = buckets.setdefault(key, [0, 0.0])
+        b[0] += qty
+        b[1] += cost
+        total_qty += qty
+        total_cost += cost
+
+    unknown_price_items = {item_names[i] for i in unknown_ids if item_names[i]}
+
+    keys = list(buckets)
+    if group in ("item", "reason"):
+        keys.sort(key=lambda k: (buckets[k][1], buckets[k][0]), reverse=True)
+
+    return {
+        "start": start_date.isoformat(),
+        "end": end_date.isoformat(),
+        "group": group,
+        "keys": keys,
+        "qty": [buckets[k][0] for k in keys],
+        "cost": [round(buckets[k][1], 2) for k in keys],
+        "total_qty": total_qty,
+        "total_cost": round(total_cost, 2),
+        "unknown_price_items": sorted(unknown_price_items),
+    }
+
+# -- WEEKLY ROLLUPS
+# In memory: {"days": {iso: roll}, "weeks": {monday_iso: roll}} where a roll is
+# {"qty", "cost", "items": {item: [qty, cost, n_entries]}, "unknown": {item: n_days}}.
+# Costs are kept unrounded so subtracting a day's old roll is exact enough; round on read.
+
+def _empty_roll():
+    return {"qty": 0, "cost": 0.0, "items": {}, "unknown": {}}
+
+def _rollup_day(day, resolve_price, ordinal: int) -> dict:
+    """Same per-entry rules as aggregate_week(), for a single day. resolve_price comes from price_resolver()."""
+    roll = _empty_roll()
+    entries = (day.get("entries", []) if isinstance(day, dict) else []) or []
+    for e in entries:
+        item = str(e.get("item", "")).strip()
+        try:
+            qty = int(e.get("qty", 0))
+        except Exception:
+            qty = 0
+
+        unit_price = _stored_unit_price(e)
+        if unit_price is None:
+            unit_price = resolve_price(item, ordinal)
+
+        if unit_price is None and item:
+            roll["unknown"][item] = 1
+
+        cost = (qty * unit_price) if unit_price is not None else 0.0
+
+        roll["qty"] += qty
+        roll["cost"] += cost
+        it = roll["items"].setdefault(item, [0, 0.0, 0])
+        it[0] += qty
+        it[1] += cost
+        it[2] += 1
+    return roll
+
+def _roll_add(target: dict, roll: dict, sign: int):
+    target["qty"] += sign * roll["qty"]
+    target["cost"] += sign * roll["cost"]
+
+    for item, (qty, cost, n) in roll["items"].items():
+        it = target["items"].setdefault(item, [0, 0.0, 0])
+        it[0] += sign * qty
+        it[1] += sign * cost
+        it[2] += sign * n
+        if it[2] <= 0:
+            del target["items"][item]
+
+    for item, n in roll["unknown"].items():
+        left = target["unknown"].get(item, 0) + sign * n
+        if left > 0:
+            target["unknown"][item] = left
+        else:
+            target["unknown"].pop(item, None)
+
+def _rollups_apply_day(rollups: dict, iso: str, new_roll):
+    d = parse_iso_date(iso)
+    if not d:
+        return
+    week_key = monday_of_week(d).isoformat()
+    week = rollups["weeks"].setdefault(week_key, _empty_roll())
+
+    old_roll = rollups["days"].pop(iso, None)
+    if old_roll is not None:
+        _roll_add(week, old_roll, -1)
+    if new_roll is not None:
+        rollups["days"][iso] = new_roll
+        _roll_add(week, new_roll, 1)
+
+    if not week["items"]:
+        rollups["weeks"].pop(week_key, None)
+
+def _build_waste_rollups(logs: dict, price_map: dict) -> dict:
+    rollups = {"days": {}, "weeks": {}}
+    resolve = price_resolver(price_map)
+    for iso, day in logs.items():
+        d = parse_iso_date(iso)
+        _rollups_apply_day(rollups, iso, _rollup_day(day, resolve, d.toordinal() if d else 0))
+    return rollups
+
+# On disk: WASTE_ROLLUPS_PATH/meta.json holds the source signature, and one
+# week-<monday>.json per week holds {"week": roll, "days": {iso: roll}}. A save
+# rewrites one small week file, so its cost doesn't grow with history.
+
+def _rollup_week_path(week_iso: str) -> str:
+    return os.path.join(_abs_path(loc_tmp(WASTE_ROLLUPS_PATH)), f"week-{week_iso}.json")
+
+def _rollup_meta_path() -> str:
+    return os.path.join(_abs_path(loc_tmp(WASTE_ROLLUPS_PATH)), "meta.json")
+
+def _read_json_or_none(path: str):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def _write_rollup_file(path: str, data):
+    # Readers never take the journal lock, so swap files in atomically. Writers hold it, so
+    # there is nothing to group-commit with, and the files are rebuilt from the logs if lost,
+    # so they skip the fsyncs (a rebuild writes two per week otherwise).
+    _replace_file(path, data, _dump_json_compact, durable=False)
+
+def _rollups_signature():
+    meta = cached_load("waste_rollups_meta", [_rollup_meta_path()], lambda: _read_json_or_none(_rollup_meta_path()))
+    return (meta or {}).get("source_signature")
+
+def _rebuild_waste_rollups_locked() -> dict:
+    # Caller holds the journal lock.
+    _, price_map = pastry_items_and_price_map()
+    rollups = _build_waste_rollups(_read_waste_logs(), price_map)
+
+    root = _abs_path(loc_tmp(WASTE_ROLLUPS_PATH))
+    os.makedirs(root, exist_ok=True)
+    for f in os.listdir(root):
+        if f.startswith("week-"):
+            os.remove(os.path.join(root, f))
+
+    days_by_week = {}
+    for iso, roll in rollups["days"].items():
+        days_by_week.setdefault(monday_of_week(parse_iso_date(iso)).isoformat(), {})[iso] = roll
+    for week_iso, week in rollups["weeks"].items():
+        _write_rollup_file(_rollup_week_path(week_iso), {"week": week, "days": days_by_week.get(week_iso, {})})
+
+    rollups["source_signature"] = _waste_source_signature()
+    _write_rollup_file(_rollup_meta_path(), {"source_signature": rollups["source_signature"]})
+    return rollups
+
+def rebuild_waste_rollups() -> dict:
+    with _waste_journal_locked():
+        return _rebuild_waste_rollups_locked()
+
+def _update_waste_rollups(days: dict, signature_before: str):
+    """
+    Called by save_waste_days() under the journal lock. If the rollups matched the data
+    before this save, only the saved days' week files are touched; otherwise rebuild.
+    """
+    by_week = {}
+    for date_iso, day in days.items():
+        d = parse_iso_date(date_iso)
+        if not d:
+            by_week = None
+            break
+        by_week.setdefault(monday_of_week(d).isoformat(), {})[date_iso] = day
+
+    if by_week is None or _read_json_or_none(_rollup_meta_path()) != {"source_signature": signature_before}:
+        _rebuild_waste_rollups_locked()
+        return
+
+    _, price_map = pastry_items_and_price_map()
+    resolve = price_resolver(price_map)
+    for week_iso, week_days in by_week.items():
+        stored = _read_json_or_none(_rollup_week_path(week_iso)) or {"week": _empty_roll(), "days": {}}
+        rollups = {"days": stored["days"], "weeks": {week_iso: stored["week"]}}
+        for date_iso, day in week_days.items():
+            _rollups_apply_day(rollups, date_iso, _rollup_day(day, resolve, parse_iso_date(date_iso).toordinal()))
+
+        if week_iso in rollups["weeks"]:
+            _write_rollup_file(_rollup_week_path(week_iso), {"week": rollups["weeks"][week_iso], "days": rollups["days"]})
+        elif os.path.exists(_rollup_week_path(week_iso)):
+            os.remove(_rollup_week_path(week_iso))
+    _write_rollup_file(_rollup_meta_path(), {"source_signature": _waste_source_signature()})
+
+@timed
+def load_waste_rollup_week(week_iso: str) -> dict:
+    """{"week": roll, "days": {iso: roll}} for one week, rebuilding all rollups first if stale."""
+    if _rollups_signature() != _waste_source_signature():
+        with _waste_journal_locked():
+            # Another worker may have rebuilt while we waited for the lock.
+            meta = _read_json_or_none(_rollup_meta_path())
+            if (meta or {}).get("source_signature") != _waste_source_signature():
+                _rebuild_waste_rollups_locked()
+
+    path = _rollup_week_path(week_iso)
+    stored = cached_load(f"waste_rollup_week:{path}", [path], lambda: _read_json_or_none(path))
+    return stored or {"week": _empty_roll(), "days": {}}
+
+def waste_week_rollup(start_date: date) -> dict:
+    """aggregate_week() output for the week starting start_date, read from the rollups."""
+    stored = load_waste_rollup_week(start_date.isoformat())
+    week = stored["week"]
+
+    daily = []
+    for i in range(7):
+        d = start_date + timedelta(days=i)
+        iso = d.isoformat()
+        day = stored["days"].get(iso) or _empty_roll()
+        daily.append(
+            {
+                "iso": iso,
+                "label": display_full_date(d),
+                "qty": day["qty"],
+                "cost": round(day["cost"], 2),
+            }
+        )
+
+    item_map = {k: {"qty": v[0], "cost": v[1]} for k, v in week["items"].items()}
+    items = [
+        {"item": k, "qty": v["qty"], "cost": round(v["cost"], 2)}
+        for k, v in item_map.items()
+        if k
+    ]
+    items.sort(key=lambda x: (x["cost"], x["qty"]), reverse=True)
+
+    return {
+        "total_qty": week["qty"],
+        "total_cost": round(week["cost"], 2),
+        "items": items,
+        "item_map": item_map,
+        "daily": daily,
+        "unknown_price_items": sorted(week["unknown"]),
+    }
+
+def check_waste_rollups() -> list:
+    """Weeks whose rollup disagrees with aggregate_week() over the raw log."""
+    _, price_map = pastry_items_and_price_map()
+    weeks = set()
+    store = load_waste_store()
+    for ordinal in store.day_ordinal:
+        weeks.add(monday_of_week(date.fromordinal(ordinal)))
+
+    mismatched = []
+    for start in sorted(weeks):
+        raw = aggregate_week(store, start, price_map)
+        rolled = waste_week_rollup(start)
+        raw_items = {k: (v["qty"], round(v["cost"], 2)) for k, v in raw["item_map"].items()}
+        rolled_items = {k: (v["qty"], round(v["cost"], 2)) for k, v in rolled["item_map"].items()}
+        if (
+            raw["total_qty"] != rolled["total_qty"]
+            or raw["total_cost"] != rolled["total_cost"]
+            or raw["daily"] != rolled["daily"]
+            or raw["unknown_price_items"] != rolled["unknown_price_items"]
+            or raw_items != rolled_items
+        ):
+            mismatched.append(start.isoformat())
+    return mismatched
+
+# -- CROSS-LOCATION ROLLUP
+# The all-locations week reads each location's rollups in its own pool process, so it
+# takes about as long as the slowest store rather than the sum of them, and none of it
+# runs on (or warms caches in) the worker serving a single store's pages. The pool is
+# spawned, not forked: a worker's persist/HTTP threads may be holding locks at fork time.
+LOCATION_POOL_WORKERS = int(os.getenv("LOCATION_POOL_WORKERS", "4"))
+_location_pool = None
+_location_pool_lock = threading.Lock()
+
+def _location_pool_executor() -> ProcessPoolExecutor:
+    global _location_pool
+    with _location_pool_lock:
+        if _location_pool is None:
+            # Inherited by the children, which import this module and must not boot-pull.
+            os.environ[LOCATION_POOL_CHILD_ENV] = "1"
+            _location_pool = ProcessPoolExecutor(
+                max_workers=max(1, min(LOCATION_POOL_WORKERS, len(LOCATIONS))),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _location_pool
+
+def _reset_location_pool():
+    global _location_pool
+    with _location_pool_lock:
+        pool, _location_pool = _location_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+atexit.register(_reset_location_pool)
+
+def _location_week_rollup(slug: str, start_iso: str) -> dict:
+    """One location's waste_week_rollup(); runs in a pool process."""
+    with using_location(LOCATIONS[slug]):
+        return waste_week_rollup(date.fromisoformat(start_iso))
+
+@timed
+def cross_location_week_rollup(start_date: date) -> dict:
+    """Every location's week plus the combined totals, items and days."""
+    slugs = list(LOCATIONS)
+    start_iso = start_date.isoformat()
+    weeks = None
+    if len(slugs) > 1 and LOCATION_POOL_WORKERS > 1:
+        try:
+            weeks = list(_location_pool_executor().map(_location_week_rollup, slugs, [start_iso] * len(slugs)))
+        except Exception as e:  # BrokenProcessPool, a child that couldn't start, ...
+            print(f"[WARN] Cross-location pool failed ({e}); aggregating in-process")
+            _reset_location_pool()
+    if weeks is None:
+        weeks = [_location_week_rollup(slug, start_iso) for slug in slugs]
+
+    item_map = {}
+    daily = [dict(d, cost=0.0, qty=0) for d in weeks[0]["daily"]]
+    per_location = []
+    for slug, week in zip(slugs, weeks):
+        per_location.append({
+            **LOCATIONS[slug].to_dict(),
+            "total_qty": week["total_qty"],
+            "total_cost": week["total_cost"],
+            "unknown_price_items": week["unknown_price_items"],
+        })
+        for item, v in week["item_map"].items():
+            it = item_map.setdefault(item, {"qty": 0, "cost": 0.0})
+            it["qty"] += v["qty"]
+            it["cost"] += v["cost"]
+        for total, day in zip(daily, week["daily"]):
+            total["qty"] += day["qty"]
+            total["cost"] += day["cost"]
+
+    for day in daily:
+        day["cost"] = round(day["cost"], 2)
+    items = [{"item": k, "qty": v["qty"], "cost": round(v["cost"], 2)} for k, v in item_map.items() if k]
+    items.sort(key=lambda x: (x["cost"], x["qty"]), reverse=True)
+
+    return {
+        "start": start_iso,
+        "end": (start_date + timedelta(days=6)).isoformat(),
+        "total_qty": sum(w["total_qty"] for w in weeks),
+        "total_cost": round(sum(w["total_cost"] for w in weeks), 2),
+        "locations": per_location,
+        "items": items,
+        "daily": daily,
+    }
+
+# -- TRENDS
+# One pass over the WasteStore fills per-day qty/cost (overall and per item, priced like
+# aggregate_week()); running totals of those make any date window two array lookups, so a
+# 52-week series, its moving average and the year-before comparison cost O(weeks), not
+# O(weeks x entries). Built lazily per location and cached until the waste/price files change.
+TREND_WEEKS_DEFAULT = 52
+TREND_WEEKS_MAX = 156
+TREND_MOVING_AVG_WEEKS = 4
+TREND_TOP_ITEMS = 10
+
+class WasteTrends:
+    def __init__(self, store: WasteStore, resolve_price):
+        """resolve_price comes from price_resolver(); entries are costed exactly as in aggregate_week()."""
+        self.item_names = list(store.item_names)
+        ordinals = store.day_ordinal
+        self.origin = ordinals[0] if len(ordinals) else date.today().toordinal()
+        n = (ordinals[-1] - self.origin + 1) if len(ordinals) else 0
+
+        day_qty = [0] * n
+        day_cost = [0.0] * n
+        item_qty, item_cost = {}, {}  # item id -> per-day list
+        names = store.item_names
+        if n:
+            first, last = date.fromordinal(self.origin), date.fromordinal(ordinals[-1])
+            for ordinal, item, _, qty, unit_price in store.entries(first, last):
+                if unit_price is None:
+                    unit_price = resolve_price(names[item], ordinal)
+                cost = (qty * unit_price) if unit_price is not None else 0.0
+                i = ordinal - self.origin
+                day_qty[i] += qty
+                day_cost[i] += cost
+                if not names[item]:
+                    continue
+                if item not in item_qty:
+                    item_qty[item], item_cost[item] = [0] * n, [0.0] * n
+                item_qty[item][i] += qty
+                item_cost[item][i] += cost
+
+        # cum[i] = total over the first i days, so [a, b] is cum[b + 1] - cum[a].
+        self.cum_qty = array("q", itertools.accumulate(day_qty, initial=0))
+        self.cum_cost = array("d", itertools.accumulate(day_cost, initial=0.0))
+        self.item_cum = {
+            item: (array("q", itertools.accumulate(item_qty[item], initial=0)),
+                   array("d", itertools.accumulate(item_cost[item], initial=0.0)))
+            for item in item_qty
+        }
+
+    def _span(self, start_date: date, end_date: date):
+        n = len(self.cum_qty) - 1
+        lo = min(max(start_date.toordinal() - self.origin, 0), n)
+        hi = min(max(end_date.toordinal() - self.origin + 1, 0), n)
+        return lo, max(lo, hi)
+
+    def totals(self, start_date: date, end_date: date):
+        """(qty, cost) logged between start_date and end_date inclusive."""
+        lo, hi = self._span(start_date, end_date)
+        return self.cum_qty[hi] - self.cum_qty[lo], self.cum_cost[hi] - self.cum_cost[lo]
+
+    def item_totals(self, start_date: date, end_date: date) -> dict:
+        """item -> (qty, cost) for items with waste in the window."""
+        lo, hi = self._span(start_date, end_date)
+        out = {}
+        for item, (cq, cc) in self.item_cum.items():
+            qty = cq[hi] - cq[lo]
+            if qty or cc[hi] != cc[lo]:
+                out[self.item_names[item]] = (qty, cc[hi] - cc[lo])
+        return out
+
+    def weekly(self, first_monday: date, weeks: int) -> list:
+        """(qty, cost) for each of `weeks` weeks starting at first_monday."""
+        return [
+            self.totals(first_monday + timedelta(days=7 * w), first_monday + timedelta(days=7 * w + 6))
+            for w in range(weeks)
+        ]
+
+def _build_waste_trends() -> WasteTrends:
+    _, price_map = pastry_items_and_price_map()
+    return WasteTrends(load_waste_store(), price_resolver(price_map))
+
+@timed
+def load_waste_trends() -> WasteTrends:
+    return cached_load("waste_trends", waste_data_files(), _build_waste_trends)
+
+def build_trends_report(end_date: date, weeks: int = TREND_WEEKS_DEFAULT) -> dict:
+    """
+    The `weeks` weeks ending with the week containing end_date: per-week qty/cost, a trailing
+    moving average, the same weeks a year earlier, window totals against the previous window
+    and last year, and the top items over the window.
+    """
+    trends = load_waste_trends()
+    last_monday = monday_of_week(end_date)
+    first_monday = last_monday - timedelta(days=7 * (weeks - 1))
+    window_end = last_monday + timedelta(days=6)
+    year = timedelta(days=364)  # 52 weeks, so Mondays line up
+    span = timedelta(days=7 * weeks)
+
+    series = trends.weekly(first_monday, weeks)
+    last_year = trends.weekly(first_monday - year, weeks)
+    moving_avg = []
+    for w in range(weeks):
+        start = first_monday + timedelta(days=7 * (w - TREND_MOVING_AVG_WEEKS + 1))
+        _, cost = trends.totals(start, first_monday + timedelta(days=7 * w + 6))
+        moving_avg.append(round(cost / TREND_MOVING_AVG_WEEKS, 2))
+
+    total_qty, total_cost = trends.totals(first_monday, window_end)
+    prev_qty, prev_cost = trends.totals(first_monday - span, window_end - span)
+    yoy_qty, yoy_cost = trends.totals(first_monday - year, window_end - year)
+
+    items = trends.item_totals(first_monday, window_end)
+    items_last_year = trends.item_totals(first_monday - year, window_end - year)
+    top_items = []
+    for name, (qty, cost) in sorted(items.items(), key=lambda kv: (round(kv[1][1], 2), kv[1][0]), reverse=True)[:TREND_TOP_ITEMS]:
+        ly_cost = round(items_last_year.get(name, (0, 0.0))[1], 2)
+        top_items.append({
+            "item": name,
+            "qty": qty,
+            "cost": round(cost, 2),
+            "last_year_cost": ly_cost,
+            "pct_yoy": _pct_change(round(cost, 2), ly_cost),
+        })
+
+    week_starts = [first_monday + timedelta(days=7 * w) for w in range(weeks)]
+    return {
+        "weeks": weeks,
+        "start_iso": first_monday.isoformat(),
+        "end_iso": window_end.isoformat(),
+        "start_label": display_full_date(first_monday),
+        "end_label": display_full_date(window_end),
+        "moving_avg_weeks": TREND_MOVING_AVG_WEEKS,
+
+        "total_qty": total_qty,
+        "total_cost": round(total_cost, 2),
+        "prev_total_qty": prev_qty,
+        "prev_total_cost": round(prev_cost, 2),
+        "pct_qty": _pct_change(total_qty, prev_qty),
+        "pct_cost": _pct_change(round(total_cost, 2), round(prev_cost, 2)),
+        "last_year_total_qty": yoy_qty,
+        "last_year_total_cost": round(yoy_cost, 2),
+        "pct_cost_yoy": _pct_change(round(total_cost, 2), round(yoy_cost, 2)),
+
+        "week_starts": [d.isoformat() for d in week_starts],
+        "chart_labels": [d.strftime("%b %d, %Y") for d in week_starts],
+        "weekly_qty": [q for q, _ in series],
+        "weekly_cost": [round(c, 2) for _, c in series],
+        "moving_avg_cost": moving_avg,
+        "last_year_cost": [round(c, 2) for _, c in last_year],
+        "top_items": top_items,
+    }
+
+
+@timed
 def build_weekly_waste_workbook(start_date: date, agg: dict):
+    """
+    Write-only workbook: rows are streamed to a temp file as they are appended, so
+    memory stays flat no matter how many entries the week has. Call wb.save(path).
+    """
     end_date = start_date + timedelta(days=6)
     week_label = f"{start_date.isoformat()} to {end_date.isoformat()}"
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Dashboard"
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Dashboard")
 
     # --- styles
     title_font = Font(size=16, bold=True)
+    bold_font = Font(bold=True)
     header_font = Font(bold=True, color="FFFFFF")
     header_fill = PatternFill("solid", fgColor="1F2937")  # dark slate
     center = Alignment(horizontal="center", vertical="center")
     right = Alignment(horizontal="right", vertical="center")
+    money = '"$"#,##0.00'
+
+    def cell(sheet, value, font=None, fill=None, alignment=None, number_format=None):
+        c = WriteOnlyCell(sheet, value=value)
+        if font is not None:
+            c.font = font
+        if fill is not None:
+            c.fill = fill
+        if alignment is not None:
+            c.alignment = alignment
+        if number_format is not None:
+            c.number_format = number_format
+        return c
+
+    def header_row(sheet, headers):
+        return [cell(sheet, h, font=header_font, fill=header_fill, alignment=center) for h in headers]
+
+    # widths (must be set before rows are streamed)
+    ws.column_dimensions["A"].width = 22
+    ws.column_dimensions["B"].width = 16
+    ws.column_dimensions["C"].width = 10
+    ws.column_dimensions["D"].width = 14
 
     # --- header
-    ws["A1"] = "Weekly Pastry Waste Report"
-    ws["A1"].font = title_font
-    ws["A2"] = f"Week: {week_label}"
-    ws["A3"] = f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}"
+    ws.append([cell(ws, "Weekly Pastry Waste Report", font=title_font)])
+    ws.append([f"Week: {week_label}"])
+    ws.append([f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}"])
+    ws.append([])
 
     # --- totals
-    ws["A5"] = "Totals"
-    ws["A5"].font = Font(bold=True)
-
-    ws["A6"] = "Total units wasted"
-    ws["B6"] = agg["total_qty"]
-
-    ws["A7"] = "Total waste cost"
-    ws["B7"] = agg["total_cost"]
-    ws["B7"].number_format = '"$"#,##0.00'
-
+    ws.append([cell(ws, "Totals", font=bold_font)])
+    ws.append(["Total units wasted", agg["total_qty"]])
+    ws.append(["Total waste cost", cell(ws, agg["total_cost"], number_format=money)])
+    ws.append([])
     row = 9
+
     if agg["missing_price_items"]:
-        ws["A9"] = "Missing prices (cost shown as $0.00 for these items):"
-        ws["A9"].font = Font(bold=True, color="B91C1C")
-        ws["A10"] = ", ".join(agg["missing_price_items"])
+        ws.append([cell(ws, "Missing prices (cost shown as $0.00 for these items):", font=Font(bold=True, color="B91C1C"))])
+        ws.append([", ".join(agg["missing_price_items"])])
+        ws.append([])
         row = 12
 
     # --- Daily table
-    ws[f"A{row}"] = "Cost by Day (only days with logged waste)"
-    ws[f"A{row}"].font = Font(bold=True)
-    row += 1
-
-    daily_header = ["Date", "Day", "Units", "Cost"]
-    for c, h in enumerate(daily_header, 1):
-        cell = ws.cell(row=row, column=c, value=h)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = center
-
-    row += 1
+    ws.append([cell(ws, "Cost by Day (only days with logged waste)", font=bold_font)])
+    ws.append(header_row(ws, ["Date", "Day", "Units", "Cost"]))
+    row += 2
+
     daily_start_row = row
     for r in agg["daily"]:
-        ws.cell(row=row, column=1, value=r["date"])
-        ws.cell(row=row, column=2, value=r["day"])
-        ws.cell(row=row, column=3, value=r["qty"]).alignment = right
-        ccell = ws.cell(row=row, column=4, value=r["cost"])
-        ccell.number_format = '"$"#,##0.00'
-        ccell.alignment = right
+        ws.append([
+            r["date"],
+            r["day"],
+            cell(ws, r["qty"], alignment=right),
+            cell(ws, r["cost"], alignment=right, number_format=money),
+        ])
         row += 1
     daily_end_row = row - 1
 
+    ws.append([])
+    ws.append([])
     row += 2
 
     # --- Top items table
-    ws[f"A{row}"] = "Top Items by Cost"
-    ws[f"A{row}"].font = Font(bold=True)
-    row += 1
-
-    item_header = ["Item", "Units", "Cost"]
-    for c, h in enumerate(item_header, 1):
-        cell = ws.cell(row=row, column=c, value=h)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = center
-
-    row += 1
+    ws.append([cell(ws, "Top Items by Cost", font=bold_font)])
+    ws.append(header_row(ws, ["Item", "Units", "Cost"]))
+    row += 2
+
     item_start_row = row
-    top_items = agg["items"][:15]
-    for it in top_items:
-        ws.cell(row=row, column=1, value=it["item"])
-        ws.cell(row=row, column=2, value=it["qty"]).alignment = right
-        ccell = ws.cell(row=row, column=3, value=it["cost"])
-        ccell.number_format = '"$"#,##0.00'
-        ccell.alignment = right
+    for it in agg["items"][:15]:
+        ws.append([
+            it["item"],
+            cell(ws, it["qty"], alignment=right),
+            cell(ws, it["cost"], alignment=right, number_format=money),
+        ])
         row += 1
     item_end_row = row - 1
 
-    # widths
-    ws.column_dimensions["A"].width = 22
-    ws.column_dimensions["B"].width = 16
-    ws.column_dimensions["C"].width = 10
-    ws.column_dimensions["D"].width = 14
-
     # charts (Excel-native; Google Sheets may or may not convert them automatically)
     if daily_end_row >= daily_start_row:
         chart1 = BarChart()
@@ -723,31 +2965,6 @@ def build_weekly_waste_workbook(start_date: date, agg: dict):
 
     # --- Entries sheet (filterable)
     ws2 = wb.create_sheet("Entries")
-    headers = ["Date", "Day", "Item", "Reason", "Qty", "Unit Price", "Cost"]
-    for c, h in enumerate(headers, 1):
-        cell = ws2.cell(row=1, column=c, value=h)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = center
-
-    r = 2
-    for e in agg["entries"]:
-        ws2.cell(row=r, column=1, value=e["date"])
-        ws2.cell(row=r, column=2, value=e["day"])
-        ws2.cell(row=r, column=3, value=e["item"])
-        ws2.cell(row=r, column=4, value=e["reason"])
-        ws2.cell(row=r, column=5, value=e["qty"]).alignment = right
-
-        up = ws2.cell(row=r, column=6, value=(e["unit_price"] if e["unit_price"] is not None else ""))
-        if e["unit_price"] is not None:
-            up.number_format = '"$"#,##0.00'
-        up.alignment = right
-
-        cc = ws2.cell(row=r, column=7, value=e["cost"])
-        cc.number_format = '"$"#,##0.00'
-        cc.alignment = right
-        r += 1
-
     ws2.column_dimensions["A"].width = 12
     ws2.column_dimensions["B"].width = 12
     ws2.column_dimensions["C"].width = 28
@@ -756,44 +2973,460 @@ def build_weekly_waste_workbook(start_date: date, agg: dict):
     ws2.column_dimensions["F"].width = 12
     ws2.column_dimensions["G"].width = 12
     ws2.freeze_panes = "A2"
+
+    ws2.append(header_row(ws2, ["Date", "Day", "Item", "Reason", "Qty", "Unit Price", "Cost"]))
+
+    r = 2
+    for e in agg["entries"]:
+        has_price = e["unit_price"] is not None
+        ws2.append([
+            e["date"],
+            e["day"],
+            e["item"],
+            e["reason"],
+            cell(ws2, e["qty"], alignment=right),
+            cell(ws2, e["unit_price"] if has_price else "", alignment=right, number_format=money if has_price else None),
+            cell(ws2, e["cost"], alignment=right, number_format=money),
+        ])
+        r += 1
+
     ws2.auto_filter.ref = f"A1:G{max(1, r-1)}"
 
     return wb
 
+# -- WORKBOOK CACHE
+# Generated exports are kept on disk, keyed by week start plus a hash of that week's
+# entries and the prices they fall back on, so a closed week is only built once.
+WASTE_EXPORT_CACHE_DIR = os.getenv("WASTE_EXPORT_CACHE_DIR", "/tmp/redchurch_exports")
+WASTE_EXPORT_CACHE_MAX_FILES = int(os.getenv("WASTE_EXPORT_CACHE_MAX_FILES", "200"))
 
-# ---------- Routes ----------
+def weekly_export_cache_key(start_date: date) -> str:
+    days = load_waste_range(start_date, start_date + timedelta(days=6))
+    _, price_map = pastry_items_and_price_map()
+    resolve = price_resolver(price_map)
 
-@app.route("/", methods=["GET"])
-def index():
-    catalog = load_catalog()
+    # Fallback prices in effect on each day, for the items logged that day.
+    prices = {}
+    for iso, day in days.items():
+        ordinal = date.fromisoformat(iso).toordinal()
+        for e in (day.get("entries", []) if isinstance(day, dict) else []) or []:
+            item = str(e.get("item", "")).strip()
+            prices.setdefault(iso, {})[item] = resolve(item, ordinal)
+
+    payload = json.dumps(
+        {"days": {k: (v.get("entries", []) if isinstance(v, dict) else []) for k, v in days.items()}, "prices": prices},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()[:20]
+    return f"{start_date.isoformat()}_{digest}"
+
+@timed
+def cached_weekly_waste_workbook(start_date: date) -> str:
+    """Path to the .xlsx for this week, building it only when the week's content changed."""
+    cache_dir = loc_tmp(WASTE_EXPORT_CACHE_DIR)
+    os.makedirs(cache_dir, exist_ok=True)
+    key = weekly_export_cache_key(start_date)
+    path = os.path.join(cache_dir, f"{key}.xlsx")
+    if os.path.exists(path):
+        return path
+
+    agg = weekly_waste_aggregate_for_export(start_date)
+    wb = build_weekly_waste_workbook(start_date, agg)
+    # Per thread too: two gthread requests for the same week must not share a temp file.
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    wb.save(tmp)
+    os.replace(tmp, path)
+
+    _prune_export_cache(cache_dir, start_date.isoformat(), keep=path)
+    return path
+
+def _prune_export_cache(cache_dir: str, week_iso: str, keep: str):
+    try:
+        files = [
+            os.path.join(cache_dir, f)
+            for f in os.listdir(cache_dir)
+            if f.endswith(".xlsx")
+        ]
+    except OSError:
+        return
 
-    def sort_key(item):
+    # Older builds of the same week are stale; beyond that, drop the least recently built.
+    stale = [f for f in files if f != keep and os.path.basename(f).startswith(f"{week_iso}_")]
+    rest = [f for f in files if f not in stale]
+    rest.sort(key=lambda f: os.path.getmtime(f) if os.path.exists(f) else 0)
+    stale += rest[:max(0, len(rest) - WASTE_EXPORT_CACHE_MAX_FILES)]
+
+    for f in stale:
         try:
-            type_index = TYPE_ORDER.index(item.get("type", "Other"))
-        except ValueError:
-            type_index = len(TYPE_ORDER)
+            os.remove(f)
+        except OSError:
+            pass
 
-        name_for_sort = (item.get("display_name") or item["name"]).lower()
 
-        # Special sorting for Cups
-        if item.get("type") == "Cups":
-            return (
-                type_index,
-                cup_subtype(name_for_sort),
-                extract_oz(name_for_sort),
-                name_for_sort
+# -- ORDER CART STORE
+# Every store keeps {cart_id: {sku: qty}} and does add/remove as one atomic step,
+# so concurrent requests on different workers never lose an update.
+# Where the order being built lives: "file" (default, shared by all workers via flock),
+# "sqlite", or "memory" (single worker only, the old behaviour).
+CART_STORE = os.getenv("CART_STORE", "file").strip().lower()
+CART_FILE_PATH = os.getenv("CART_FILE_PATH", "/tmp/redchurch_cart.json")
+CART_DB_PATH = os.getenv("CART_DB_PATH", "/tmp/redchurch_cart.db")
+# Give each browser its own cart (cookie) instead of one cart shared by the whole café.
+CART_PER_SESSION = _to_bool(os.getenv("CART_PER_SESSION"), default=False)
+CART_COOKIE = "cart_id"
+SHARED_CART_ID = "shared"
+
+class MemoryCartStore:
+    def __init__(self):
+        self._carts = {}
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    def version(self, cart_id: str):
+        return self._generation
+
+    def get(self, cart_id: str) -> dict:
+        with self._lock:
+            return dict(self._carts.get(cart_id, {}))
+
+    def add(self, cart_id: str, sku: str, qty: int):
+        with self._lock:
+            cart = self._carts.setdefault(cart_id, {})
+            cart[sku] = cart.get(sku, 0) + qty
+            self._generation += 1
+
+    def remove(self, cart_id: str, sku: str):
+        with self._lock:
+            self._carts.get(cart_id, {}).pop(sku, None)
+            self._generation += 1
+
+
+class FileCartStore:
+    def __init__(self, path: str):
+        self.path = path
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _update(self, fn):
+        # Read-modify-write under the file's writer lock; concurrent updates share a commit.
+        def apply(carts):
+            carts = carts if isinstance(carts, dict) else {}
+            fn(carts)
+            return carts
+        update_json_file(self.path, apply, dump=json.dump)
+
+    def version(self, cart_id: str):
+        return _file_signature(self.path)
+
+    def get(self, cart_id: str) -> dict:
+        # Writers swap the file in with os.replace, so a plain read is never torn.
+        return dict(self._read().get(cart_id, {}))
+
+    def add(self, cart_id: str, sku: str, qty: int):
+        def add(carts):
+            cart = carts.setdefault(cart_id, {})
+            cart[sku] = cart.get(sku, 0) + qty
+        self._update(add)
+
+    def remove(self, cart_id: str, sku: str):
+        def remove(carts):
+            cart = carts.get(cart_id, {})
+            cart.pop(sku, None)
+            if not cart:
+                carts.pop(cart_id, None)
+        self._update(remove)
+
+
+class SqliteCartStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cart_items ("
+                "cart_id TEXT NOT NULL, sku TEXT NOT NULL, qty INTEGER NOT NULL, "
+                "added_at REAL NOT NULL, PRIMARY KEY (cart_id, sku))"
             )
+            self._local.conn = conn
+        return conn
 
-        # Default sorting for all other types
-        return (type_index, name_for_sort)
+    def version(self, cart_id: str):
+        return _file_signature(self.path)
+
+    def get(self, cart_id: str) -> dict:
+        rows = self._conn().execute(
+            "SELECT sku, qty FROM cart_items WHERE cart_id = ? ORDER BY added_at", (cart_id,)
+        )
+        return {sku: qty for sku, qty in rows}
+
+    def add(self, cart_id: str, sku: str, qty: int):
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT INTO cart_items (cart_id, sku, qty, added_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (cart_id, sku) DO UPDATE SET qty = qty + excluded.qty",
+                (cart_id, sku, qty, time.time()),
+            )
+
+    def remove(self, cart_id: str, sku: str):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM cart_items WHERE cart_id = ? AND sku = ?", (cart_id, sku))
 
 
-    catalog = sorted(catalog, key=sort_key)
+def _make_cart_store():
+    if CART_STORE == "sqlite":
+        return SqliteCartStore(CART_DB_PATH)
+    if CART_STORE == "memory":
+        return MemoryCartStore()
+    return FileCartStore(CART_FILE_PATH)
+
+cart_store = _make_cart_store()
+
+def current_cart_id() -> str:
+    """Cart key in cart_store; carts at locations other than the default are prefixed "<slug>:"."""
+    if not CART_PER_SESSION:
+        cart_id = SHARED_CART_ID
+    else:
+        cart_id = request.cookies.get(CART_COOKIE, "")
+        if not re.fullmatch(r"[0-9a-f]{32}", cart_id):
+            cart_id = g.get("new_cart_id") or uuid.uuid4().hex
+            g.new_cart_id = cart_id
+
+    loc = current_location()
+    return cart_id if loc is DEFAULT_LOCATION else f"{loc.slug}:{cart_id}"
+
+@app.after_request
+def _set_cart_cookie(response):
+    cart_id = g.get("new_cart_id")
+    if cart_id:
+        response.set_cookie(CART_COOKIE, cart_id, max_age=60 * 60 * 24 * 30, httponly=True, samesite="Lax")
+    return response
+
+
+# -- STATIC ASSETS
+# Everything under static/ is read once at startup, content-hashed and precompressed, then
+# served from memory at /assets/<name>.<hash>.<ext> with a one-year immutable Cache-Control.
+# Templates emit those URLs through asset_url("waste.js"); a deploy that changes a file
+# changes its URL, so tablets never have to revalidate an asset.
+try:
+    import brotli  # optional: pip install brotli
+except ImportError:
+    brotli = None
+
+STATIC_FINGERPRINT = os.getenv("STATIC_FINGERPRINT", "1").strip().lower() not in ("0", "false", "no", "off")
+STATIC_MAX_AGE = 365 * 24 * 3600
+STATIC_COMPRESSIBLE = (".js", ".css", ".svg", ".json", ".txt", ".html")
+STATIC_COMPRESS_MIN_BYTES = 256
+STATIC_ENCODINGS = ("br", "gzip")  # preference order when the client accepts both
+
+def _static_variants(data: bytes, source: str) -> dict:
+    """encoding -> body; compressed forms are only kept when they're actually smaller."""
+    variants = {"identity": data}
+    if not source.endswith(STATIC_COMPRESSIBLE) or len(data) < STATIC_COMPRESS_MIN_BYTES:
+        return variants
+    packed = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(packed) < len(data):
+        variants["gzip"] = packed
+    if brotli is not None:
+        packed = brotli.compress(data, quality=11)
+        if len(packed) < len(data):
+            variants["br"] = packed
+    return variants
+
+def build_static_manifest(static_dir: str):
+    """
+    Returns (by_source, by_name, digest): source path ("images/logo.webp") -> fingerprinted
+    name, fingerprinted name -> asset dict, and one hash over every asset for page ETags.
+    """
+    by_source, by_name = {}, {}
+    if os.path.isdir(static_dir):
+        for root, dirs, files in os.walk(static_dir):
+            dirs.sort()
+            for fn in sorted(files):
+                path = os.path.join(root, fn)
+                source = os.path.relpath(path, static_dir).replace(os.sep, "/")
+                with open(path, "rb") as f:
+                    data = f.read()
+                content_hash = hashlib.sha1(data).hexdigest()[:12]
+                stem, ext = os.path.splitext(source)
+                name = f"{stem}.{content_hash}{ext}"
+                by_source[source] = name
+                by_name[name] = {
+                    "source": source,
+                    "mimetype": mimetypes.guess_type(fn)[0] or "application/octet-stream",
+                    "hash": content_hash,
+                    "variants": _static_variants(data, source),
+                }
+    digest = hashlib.sha1(repr(sorted(by_source.items())).encode("utf-8")).hexdigest()[:12]
+    return by_source, by_name, digest
+
+_static_by_source, _static_by_name, STATIC_VERSION = build_static_manifest(app.static_folder or "")
+if STATIC_FINGERPRINT:
+    _raw = sum(len(a["variants"]["identity"]) for a in _static_by_name.values())
+    _gz = sum(len(a["variants"].get("gzip", a["variants"]["identity"])) for a in _static_by_name.values())
+    print(f"[OK] Fingerprinted {len(_static_by_name)} static assets ({_raw // 1024} KiB, {_gz // 1024} KiB gzipped"
+          f"{'' if brotli else '; brotli not installed'})")
+
+@app.template_global()
+def asset_url(filename: str) -> str:
+    """Fingerprinted URL for a file under static/ (plain /static/ URL in debug or when disabled)."""
+    name = _static_by_source.get(filename)
+    if not STATIC_FINGERPRINT or app.debug or name is None:
+        return url_for("static", filename=filename)
+    return url_for("static_asset", name=name)
+
+def _static_encoding(asset) -> str:
+    for encoding in STATIC_ENCODINGS:
+        if encoding in asset["variants"] and request.accept_encodings.quality(encoding) > 0:
+            return encoding
+    return "identity"
+
+@app.route("/assets/<path:name>", methods=["GET"])
+def static_asset(name):
+    asset = _static_by_name.get(name)
+    if asset is None:
+        abort(404)
+
+    encoding = _static_encoding(asset)
+    etag = asset["hash"] if encoding == "identity" else f"{asset['hash']}-{encoding}"
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(asset["variants"][encoding], mimetype=asset["mimetype"])
+        if encoding != "identity":
+            response.headers["Content-Encoding"] = encoding
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = f"public, max-age={STATIC_MAX_AGE}, immutable"
+    if len(asset["variants"]) > 1:
+        response.vary.add("Accept-Encoding")
+    return response
+
+# -- RESPONSE COMPRESSION
+# HTML/JSON/text bodies above a size threshold are gzip- or brotli-compressed on the way out,
+# after the ETag hook below has run (Flask runs after_request hooks in reverse order). A
+# compressed body gets its own strong ETag ("<etag>-gzip"); not_modified_or_none accepts
+# either form. Files, XLSX downloads and /assets responses already carry their own encoding
+# or stream, so they are left alone.
+COMPRESS_ENABLED = os.getenv("COMPRESS_ENABLED", "1").strip().lower() not in ("0", "false", "no", "off")
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_GZIP_LEVEL = 6
+COMPRESS_BROTLI_QUALITY = 5
+COMPRESS_MIMETYPES = {
+    "text/html", "text/plain", "text/css", "text/javascript", "text/csv",
+    "application/json", "application/javascript", "image/svg+xml",
+}
+COMPRESS_ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+def _compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=COMPRESS_BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=COMPRESS_GZIP_LEVEL, mtime=0)
+
+@app.after_request
+def _compress_response(response):
+    if (
+        not COMPRESS_ENABLED
+        or response.status_code != 200
+        or response.direct_passthrough
+        or response.is_streamed
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESS_MIMETYPES
+        or "no-transform" in (response.headers.get("Cache-Control") or "")
+    ):
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = next((e for e in COMPRESS_ENCODINGS if request.accept_encodings.quality(e) > 0), None)
+    if encoding is None:
+        return response
+
+    packed = _compress(data, encoding)
+    if len(packed) >= len(data):
+        return response
+    response.set_data(packed)
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(f"{etag}-{encoding}")
+    metrics_inc("redchurch_response_bytes_total", len(data), encoding=encoding, stage="raw")
+    metrics_inc("redchurch_response_bytes_total", len(packed), encoding=encoding, stage="sent")
+    return response
+
+# -- CONDITIONAL GETS
+# Pages are tagged with a strong ETag built from the versions of the data they render
+# (file signatures, cart version, today's date) plus the deployed code/templates, and a
+# matching If-None-Match gets a 304 before anything is loaded or rendered.
+
+def _code_version() -> str:
+    files = [os.path.abspath(__file__)]
+    templates_dir = os.path.join(REPO_DIR, "templates")
+    if os.path.isdir(templates_dir):
+        files += [os.path.join(templates_dir, f) for f in sorted(os.listdir(templates_dir))]
+    # Pages embed fingerprinted asset URLs, so a changed asset must change their ETags too.
+    parts = [_file_signature(f) for f in files] + [STATIC_VERSION]
+    return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()[:12]
+
+CODE_VERSION = _code_version()
+
+def data_version(files: list) -> tuple:
+    return tuple(_file_signature(f) for f in files)
+
+def not_modified_or_none(*parts):
+    """Return a 304 response if the client already has this version; otherwise remember the ETag."""
+    etag = hashlib.sha1(repr((CODE_VERSION, current_location().slug, request.endpoint) + parts).encode("utf-8")).hexdigest()
+    g.etag = etag
+    # The client may hold the compressed representation, tagged "<etag>-<encoding>".
+    matched = next(
+        (tag for tag in [etag] + [f"{etag}-{e}" for e in COMPRESS_ENCODINGS] if request.if_none_match.contains(tag)),
+        None,
+    )
+    if matched:
+        response = app.response_class(status=304)
+        response.set_etag(matched)
+        response.headers["Cache-Control"] = "no-cache"
+        if COMPRESS_ENABLED:
+            response.vary.add("Accept-Encoding")
+        return response
+    return None
+
+@app.after_request
+def _set_etag(response):
+    etag = g.get("etag")
+    if etag and response.status_code == 200 and "ETag" not in response.headers:
+        response.set_etag(etag)
+        # Let the browser keep the page but revalidate every time.
+        response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+# ---------- Routes ----------
+
+@app.route("/", methods=["GET"])
+def index():
+    cart_id = current_cart_id()
+    not_modified = not_modified_or_none(data_version([FILE_NAME]), cart_id, cart_store.version(cart_id))
+    if not_modified:
+        return not_modified
+
+    catalog = load_catalog_index()["sorted"]
 
     return render_template(
         "index.html",
         items=catalog,
-        orders=orders,
+        orders=cart_store.get(current_cart_id()),
         product_types=TYPE_ORDER
     )
 
@@ -801,20 +3434,17 @@ def index():
 
 @app.route("/add_item", methods=["POST"])
 def add_item():
-    catalog = load_catalog()
     item_type = request.form["type"]
 
     if item_type not in TYPE_ORDER:
         abort(400, "Invalid Product Type")
 
-    catalog.append({
+    add_catalog_item({
         "sku": request.form["sku"],
         "name": request.form["name"],
         "unit": request.form["unit"],
         "type": item_type
     })
-
-    save_catalog(catalog)
     return redirect(url_for("index"))
 
 
@@ -822,7 +3452,7 @@ def add_item():
 def add_to_order():
     sku = request.form["sku"]
     qty = int(request.form["qty"])
-    orders[sku] = orders.get(sku, 0) + qty
+    cart_store.add(current_cart_id(), sku, qty)
 
     if request.headers.get("X-Requested-With") == "XMLHttpRequest":
         return jsonify(success=True)
@@ -831,7 +3461,7 @@ def add_to_order():
 
 @app.route("/remove_from_order", methods=["POST"])
 def remove_from_order():
-    orders.pop(request.form["sku"], None)
+    cart_store.remove(current_cart_id(), request.form["sku"])
 
     if request.headers.get("X-Requested-With") == "XMLHttpRequest":
         return jsonify(success=True)
@@ -840,10 +3470,11 @@ def remove_from_order():
 
 @app.route("/email")
 def email_order():
-    catalog = load_catalog()
+    orders = cart_store.get(current_cart_id())
     today = date.today().strftime("%B %d")
+    loc = current_location()
 
-    subject = f"Redchurch Cafe Weekly Order – {today}"
+    subject = f"{loc.name} Weekly Order – {today}"
 
     today_date = date.today()
     delivery_date = today_date + timedelta(days=1)
@@ -854,12 +3485,11 @@ def email_order():
 
 
     lines = []
-    for item in catalog:
-        if item["sku"] in orders:
-            lines.append(
-                f"{orders[item['sku']]} {item['unit']}(s) – "
-                f"[{item['sku']}] – {item['name']}"
-            )
+    for item, qty in catalog_items_in_order(orders):
+        lines.append(
+            f"{qty} {item['unit']}(s) – "
+            f"[{item['sku']}] – {item['name']}"
+        )
 
     newline = "\r\n"
 
@@ -871,10 +3501,9 @@ def email_order():
         + newline.join(lines)
         + f"{newline}{newline}"
         f"Thank you,{newline}"
-        f"Stefanie Forget{newline}"
-        f"Manager{newline}"
-        f"Redchurch Cafe{newline}"
-        f"68 King Street E, Hamilton ON"
+        + (f"{loc.manager}{newline}Manager{newline}" if loc.manager else "")
+        + f"{loc.name}{newline}"
+        f"{loc.address}"
     )
 
 
@@ -898,24 +3527,34 @@ def email_order():
 
 @app.route("/order_summary")
 def order_summary():
-    catalog = load_catalog()
+    cart_id = current_cart_id()
+    not_modified = not_modified_or_none(data_version([FILE_NAME]), cart_id, cart_store.version(cart_id))
+    if not_modified:
+        return not_modified
+
+    orders = cart_store.get(cart_id)
     summary = []
 
-    for item in catalog:
-        if item["sku"] in orders:
-            summary.append({
-                "sku": item["sku"],
-                "name": item["name"],
-                "unit": item["unit"],
-                "qty": orders[item["sku"]]
-            })
+    for item, qty in catalog_items_in_order(orders):
+        summary.append({
+            "sku": item["sku"],
+            "name": item["name"],
+            "unit": item["unit"],
+            "qty": qty
+        })
 
     return jsonify(summary)
 
 # -- WASTE LOG ROUTES
 @app.route("/waste", methods=["GET"])
 def waste_log():
-    logs = load_waste_logs()
+    not_modified = not_modified_or_none(
+        data_version(waste_data_files()), date.today().isoformat(), request.args.get("date")
+    )
+    if not_modified:
+        return not_modified
+
+    store = load_waste_store()
     items = load_pastry_prices()
     inactive_items = set(x["name"] for x in items if not x.get("active", True))
     # Only ACTIVE items should be selectable in the daily log.
@@ -931,12 +3570,16 @@ def waste_log():
     selected_iso = selected_date.isoformat()
     today_display = display_full_date(selected_date)
 
-    existing = logs.get(selected_iso, {})
-    entries = existing.get("entries", []) if isinstance(existing, dict) else []
+    existing = store.day(selected_iso) or {}
+    entries = _entries_with_client_ids(existing.get("entries", []))
     if not entries:
         entries = [{"item": "", "qty": 1, "reason": WASTE_REASONS[0]}]
 
-    date_options = build_date_options(logs, include_today=True)
+    date_options, older_dates_before = build_date_options(store, include_today=True)
+    if all(opt["iso"] != selected_iso for opt in date_options):
+        # A day further back than the first page (opened from a link or "Older days").
+        at = next((i for i, opt in enumerate(date_options) if opt["iso"] < selected_iso), len(date_options))
+        date_options.insert(at, {"iso": selected_iso, "label": today_display})
     week_start = monday_of_week(selected_date)
 
     return render_template(
@@ -948,152 +3591,459 @@ def waste_log():
         waste_reasons=WASTE_REASONS,
         initial_rows=entries,
         date_options=date_options,
+        older_dates_before=older_dates_before,
         selected_date_iso=selected_iso,
         week_start_iso=week_start.isoformat(),
+        day_version=existing.get("version", 0),
     )
 
 
-@app.route("/waste/save", methods=["POST"])
-def waste_save():
-    payload = request.get_json(silent=True) or {}
-    date_iso = str(payload.get("date", "")).strip()
-    entries = payload.get("entries", [])
+WASTE_BATCH_MAX_DAYS = int(os.getenv("WASTE_BATCH_MAX_DAYS", "400"))
 
-    d = parse_iso_date(date_iso)
-    if not d:
-        abort(400, "Invalid date. Expected YYYY-MM-DD")
+WASTE_PATCH_MAX_OPS = 200
 
-    if not isinstance(entries, list):
-        abort(400, "Invalid entries")
+def _clean_waste_entry(e, price_on_day):
+    """
+    One entry cleaned the way /waste/save always has, or None if it should be dropped.
+    price_on_day(item) is the price in effect on the entry's date (see _day_price_lookup()).
+    """
+    if not isinstance(e, dict):
+        return None
 
-    _, price_map = pastry_items_and_price_map()
+    item = str(e.get("item", "")).strip()
+    reason = str(e.get("reason", "")).strip() or "Other"
 
-    cleaned = []
-    for e in entries:
-        if not isinstance(e, dict):
-            continue
+    try:
+        qty = int(e.get("qty", 0))
+    except Exception:
+        qty = 0
 
-        item = str(e.get("item", "")).strip()
-        reason = str(e.get("reason", "")).strip() or "Other"
+    if not item or qty <= 0:
+        return None
 
-        try:
-            qty = int(e.get("qty", 0))
-        except Exception:
-            qty = 0
+    if reason not in WASTE_REASONS:
+        reason = "Other"
 
-        if not item or qty <= 0:
-            continue
+    unit_price = price_on_day(item)  # None if no price configured
 
-        if reason not in WASTE_REASONS:
-            reason = "Other"
+    return {"item": item, "qty": qty, "reason": reason, "unit_price": unit_price}
 
-        unit_price = price_map.get(item)  # may be missing if no price configured
+def _day_price_lookup(price_map: dict, d: date):
+    """item -> unit price stamped on an entry for day d: the price history's price on that day."""
+    resolve = price_resolver(price_map)
+    ordinal = d.toordinal()
+    return lambda item: resolve(item, ordinal)
 
-        cleaned.append(
-            {"item": item, "qty": qty, "reason": reason, "unit_price": unit_price}
-        )
+def clean_waste_day(date_iso: str, entries, price_map: dict):
+    """Validate one {date, entries} block the way /waste/save does. Returns (day, error)."""
+    d = parse_iso_date(date_iso)
+    if not d:
+        return None, "Invalid date. Expected YYYY-MM-DD"
+
+    if not isinstance(entries, list):
+        return None, "Invalid entries"
 
-    logs = load_waste_logs()
-    logs[date_iso] = {
+    price_on_day = _day_price_lookup(price_map, d)
+    cleaned = []
+    seen_ids = set()
+    for e in entries:
+        entry = _clean_waste_entry(e, price_on_day)
+        if entry is None:
+            continue
+        # Keep ids the client already knows about; everything else gets a fresh one.
+        entry_id = e.get("id")
+        if not _waste_entry_id_int(entry_id) or entry_id in seen_ids:
+            entry_id = new_waste_entry_id()
+        seen_ids.add(entry_id)
+        cleaned.append({"id": entry_id, **entry})
+
+    day = {
         "date": date_iso,
         "entries": cleaned,
         "updated_at": datetime.utcnow().isoformat() + "Z",
     }
+    return day, None
 
-    save_waste_logs(logs, f"Waste log {date_iso}")
-    return jsonify(success=True, saved=len(cleaned))
+def clean_waste_ops(ops, price_map: dict, d: date):
+    """
+    Validate PATCH ops for day d: {"op": "add", "entry": {...}}, {"op": "update", "id": ...,
+    "entry": {any of item/qty/reason}} or {"op": "delete", "id": ...}. Returns (ops, error).
+    """
+    price_on_day = _day_price_lookup(price_map, d)
+    if not isinstance(ops, list) or not ops:
+        return None, "Expected a non-empty 'ops' list"
+    if len(ops) > WASTE_PATCH_MAX_OPS:
+        return None, f"Too many ops (max {WASTE_PATCH_MAX_OPS})"
 
+    cleaned = []
+    for op in ops:
+        kind = op.get("op") if isinstance(op, dict) else None
+        if kind == "add":
+            entry = _clean_waste_entry(op.get("entry"), price_on_day)
+            if entry is None:
+                return None, "Invalid entry: an item and a qty of at least 1 are required"
+            cleaned.append({"op": "add", "entry": entry})
+            continue
+
+        if kind not in ("update", "delete"):
+            return None, "Unknown op (expected add, update or delete)"
+        entry_id = op.get("id")
+        if not isinstance(entry_id, str) or not entry_id:
+            return None, f"Missing entry id for {kind}"
+        if kind == "delete":
+            cleaned.append({"op": "delete", "id": entry_id})
+            continue
+
+        fields = op.get("entry")
+        if not isinstance(fields, dict):
+            return None, "Invalid entry"
+        changes = {}
+        if "item" in fields:
+            item = str(fields.get("item") or "").strip()
+            if not item:
+                return None, "Invalid entry: item can't be empty"
+            changes["item"] = item
+            changes["unit_price"] = price_on_day(item)
+        if "qty" in fields:
+            try:
+                qty = int(fields.get("qty"))
+            except Exception:
+                qty = 0
+            if qty <= 0:
+                return None, "Invalid entry: qty must be at least 1 (delete the entry instead)"
+            changes["qty"] = qty
+        if "reason" in fields:
+            reason = str(fields.get("reason") or "").strip()
+            changes["reason"] = reason if reason in WASTE_REASONS else "Other"
+        cleaned.append({"op": "update", "id": entry_id, "entry": changes})
+    return cleaned, None
+
+def _entries_with_client_ids(entries: list) -> list:
+    """Entries saved before ids existed are addressed by position ("p<n>") until patched."""
+    return [e if e.get("id") else {"id": f"p{pos}", **e} for pos, e in enumerate(entries)]
+
+@app.route("/waste/save", methods=["POST"])
+def waste_save():
+    """
+    Replace one day: {"date": "YYYY-MM-DD", "version": n, "entries": [...]}. version is the
+    one the client loaded (0 for a new day); answers 409 with the stored day if it moved on.
+    """
+    payload = request.get_json(silent=True) or {}
+    date_iso = str(payload.get("date", "")).strip()
+    entries = payload.get("entries", [])
+    base_version = payload.get("version")
+    if not isinstance(base_version, int) or isinstance(base_version, bool):
+        abort(400, "Missing or invalid version")
 
-@app.route("/waste/weekly", methods=["GET"])
-def waste_weekly():
-    logs = load_waste_logs()
     _, price_map = pastry_items_and_price_map()
+    day, error = clean_waste_day(date_iso, entries, price_map)
+    if error:
+        abort(400, error)
+
+    conflict = save_waste_day(date_iso, day, f"Waste log {date_iso}", base_version)
+    if conflict is not None:
+        return jsonify(
+            success=False,
+            error="This day was changed on another device",
+            version=conflict.get("version", 0),
+            entries=_entries_with_client_ids(conflict.get("entries", [])),
+        ), 409
+
+    return jsonify(success=True, saved=len(day["entries"]), version=day["version"])
+
+@app.route("/waste/save_batch", methods=["POST"])
+def waste_save_batch():
+    """
+    Back-fill several days at once: {"days": [{"date": "YYYY-MM-DD", "entries": [...]}, ...]}.
+    Each block is validated like /waste/save. All-or-nothing: if any block is invalid, the
+    answer is 400 with per-day results and nothing is written; otherwise every day is
+    written under one journal lock and pushed as one commit.
+    """
+    payload = request.get_json(silent=True) or {}
+    blocks = payload.get("days")
+    if not isinstance(blocks, list) or not blocks:
+        abort(400, "Expected a non-empty 'days' list")
+    if len(blocks) > WASTE_BATCH_MAX_DAYS:
+        abort(400, f"Too many days in one batch (max {WASTE_BATCH_MAX_DAYS})")
 
+    _, price_map = pastry_items_and_price_map()
+
+    days = {}
+    results = []
+    failed = False
+    for block in blocks:
+        block = block if isinstance(block, dict) else {}
+        date_iso = str(block.get("date", "")).strip()
+        day, error = clean_waste_day(date_iso, block.get("entries", []), price_map)
+        if not error and date_iso in days:
+            error = "Duplicate date in batch"
+        if error:
+            failed = True
+            results.append({"date": date_iso, "success": False, "error": error})
+            continue
+        days[date_iso] = day
+        results.append({"date": date_iso, "success": True, "saved": len(day["entries"])})
+
+    if failed:
+        for r in results:
+            if r["success"]:
+                r.update(success=False, saved=0, error="Not saved: another day in the batch is invalid")
+        return jsonify(success=False, saved_days=0, results=results), 400
+
+    first, last = min(days), max(days)
+    message = f"Waste log {first}" if len(days) == 1 else f"Waste logs {first}..{last} ({len(days)} days)"
+    save_waste_days(days, message)
+    return jsonify(success=True, saved_days=len(days), results=results)
+
+@app.route("/api/waste/dates", methods=["GET"])
+def api_waste_dates():
+    """
+    Logged dates for the picker, newest first. ?before=YYYY-MM-DD&limit=N pages backwards
+    (follow "next" until it is null); ?start=&end= lists every logged date in a range.
+    """
+    store = load_waste_store()
     start_str = (request.args.get("start") or "").strip()
-    start_date = parse_iso_date(start_str) if start_str else monday_of_week(date.today())
-    if not start_date:
-        start_date = monday_of_week(date.today())
+    end_str = (request.args.get("end") or "").strip()
+    if start_str or end_str:
+        start_date, end_date = parse_iso_date(start_str), parse_iso_date(end_str)
+        if not start_date or not end_date or end_date < start_date:
+            abort(400, "Invalid range. Expected start <= end as YYYY-MM-DD")
+        days = store.dates_between(start_date, end_date)[::-1]
+        return jsonify(dates=[{"iso": d.isoformat(), "label": display_full_date(d)} for d in days], next=None)
+
+    before_str = (request.args.get("before") or "").strip()
+    before = parse_iso_date(before_str) if before_str else None
+    if before_str and not before:
+        abort(400, "Invalid cursor. Expected before=YYYY-MM-DD")
+    try:
+        limit = int(request.args.get("limit", 60))
+    except ValueError:
+        abort(400, "Invalid limit")
+    limit = max(1, min(limit, WASTE_DATE_PAGE_MAX))
+
+    opts, next_before = build_date_options(store, include_today=before is None, limit=limit, before=before)
+    return jsonify(dates=opts, next=next_before)
+
+@app.route("/api/locations", methods=["GET"])
+def api_locations():
+    return jsonify(
+        locations=[loc.to_dict() for loc in LOCATIONS.values()],
+        current=current_location().slug,
+        default=DEFAULT_LOCATION.slug,
+    )
 
+@app.route("/api/waste/weekly/locations", methods=["GET"])
+def api_waste_weekly_locations():
+    """Cross-location week (?start=YYYY-MM-DD, any day of the week; default this week)."""
+    start_str = (request.args.get("start") or "").strip()
+    start_date = parse_iso_date(start_str) if start_str else date.today()
+    if not start_date:
+        abort(400, "Invalid start. Expected YYYY-MM-DD")
     start_date = monday_of_week(start_date)
-    end_date = start_date + timedelta(days=6)
 
-    # Build week dropdown (last 12 weeks)
-    this_monday = monday_of_week(date.today())
-    week_options = []
-    for w in range(12):
-        sd = this_monday - timedelta(days=7 * w)
-        week_options.append({"iso": sd.isoformat(), "label": f"Week of {display_full_date(sd)}"})
+    files = [loc.file(f) for loc in LOCATIONS.values() for f in (WASTE_FILE, WASTE_JOURNAL_FILE, PASTRY_PRICES_FILE, PASTRY_PRICE_HISTORY_FILE)]
+    not_modified = not_modified_or_none(data_version(files), start_date.isoformat())
+    if not_modified:
+        return not_modified
+    return jsonify(cross_location_week_rollup(start_date))
+
+@app.route("/waste/day/<date_iso>", methods=["GET"])
+def waste_day_view(date_iso):
+    if not parse_iso_date(date_iso):
+        abort(400, "Invalid date. Expected YYYY-MM-DD")
+    day = current_waste_day(date_iso) or {}
+    return jsonify(
+        date=date_iso,
+        version=day.get("version", 0),
+        entries=_entries_with_client_ids(day.get("entries", [])),
+    )
 
-    curr = aggregate_week(logs, start_date, price_map)
-    prev_start = start_date - timedelta(days=7)
-    prev = aggregate_week(logs, prev_start, price_map)
+@app.route("/waste/day/<date_iso>", methods=["PATCH"])
+def waste_day_patch(date_iso):
+    """
+    Entry-level changes to one day: {"version": n, "ops": [...]} (see clean_waste_ops).
+    Answers 409 with the stored day when an update/delete was based on an old version.
+    """
+    d = parse_iso_date(date_iso)
+    if not d:
+        abort(400, "Invalid date. Expected YYYY-MM-DD")
 
-    # Trend vs last week
-    delta_qty = curr["total_qty"] - prev["total_qty"]
-    delta_cost = round(curr["total_cost"] - prev["total_cost"], 2)
+    payload = request.get_json(silent=True) or {}
+    base_version = payload.get("version")
+    if base_version is not None and (not isinstance(base_version, int) or isinstance(base_version, bool)):
+        abort(400, "Invalid version")
 
-    def pct_change(curr_val, prev_val):
-        if prev_val == 0:
-            return None
-        return round(((curr_val - prev_val) / prev_val) * 100, 1)
+    _, price_map = pastry_items_and_price_map()
+    ops, error = clean_waste_ops(payload.get("ops"), price_map, d)
+    if error:
+        abort(400, error)
+
+    day, ids, conflict = patch_waste_day(date_iso, base_version, ops, f"Waste log {date_iso}")
+    if conflict is not None:
+        return jsonify(
+            success=False,
+            error="This day was changed on another device",
+            version=conflict.get("version", 0),
+            entries=_entries_with_client_ids(conflict.get("entries", [])),
+        ), 409
+
+    return jsonify(
+        success=True,
+        version=day.get("version", 0),
+        entries=day["entries"],
+        renamed=ids["renamed"],
+        added=ids["added"],
+    )
 
-    pct_qty = pct_change(curr["total_qty"], prev["total_qty"])
-    pct_cost = pct_change(curr["total_cost"], prev["total_cost"])
+
+def _weekly_start_arg() -> date:
+    start_str = (request.args.get("start") or "").strip()
+    start_date = parse_iso_date(start_str) if start_str else monday_of_week(date.today())
+    if not start_date:
+        start_date = monday_of_week(date.today())
+    return monday_of_week(start_date)
+
+def _pct_change(curr_val, prev_val):
+    if prev_val == 0:
+        return None
+    return round(((curr_val - prev_val) / prev_val) * 100, 1)
+
+def _build_weekly_dashboard(start_date: date) -> dict:
+    end_date = start_date + timedelta(days=6)
+    curr = waste_week_rollup(start_date)
+    prev = waste_week_rollup(start_date - timedelta(days=7))
 
     # Top 3 items by cost + last week comparison
     top3 = []
     for row in curr["items"][:3]:
-        item = row["item"]
-        prev_cost = round(prev["item_map"].get(item, {}).get("cost", 0.0), 2)
-        dcost = round(row["cost"] - prev_cost, 2)
-        pc = pct_change(row["cost"], prev_cost)
+        prev_cost = round(prev["item_map"].get(row["item"], {}).get("cost", 0.0), 2)
         top3.append({
-            "item": item,
+            "item": row["item"],
             "qty": row["qty"],
             "cost": row["cost"],
             "prev_cost": prev_cost,
-            "delta_cost": dcost,
-            "pct_cost": pc,
+            "delta_cost": round(row["cost"] - prev_cost, 2),
+            "pct_cost": _pct_change(row["cost"], prev_cost),
         })
 
-    # Chart data
-    chart_daily_labels = [d["label"] for d in curr["daily"]]
-    chart_daily_costs = [d["cost"] for d in curr["daily"]]
-
     top_items_for_chart = curr["items"][:5]
-    chart_item_labels = [x["item"] for x in top_items_for_chart]
-    chart_item_costs = [x["cost"] for x in top_items_for_chart]
+    return {
+        "start_iso": start_date.isoformat(),
+        "end_iso": end_date.isoformat(),
+        "start_label": display_full_date(start_date),
+        "end_label": display_full_date(end_date),
+
+        "total_qty": curr["total_qty"],
+        "total_cost": curr["total_cost"],
+        "prev_total_qty": prev["total_qty"],
+        "prev_total_cost": prev["total_cost"],
+        "delta_qty": curr["total_qty"] - prev["total_qty"],
+        "delta_cost": round(curr["total_cost"] - prev["total_cost"], 2),
+        "pct_qty": _pct_change(curr["total_qty"], prev["total_qty"]),
+        "pct_cost": _pct_change(curr["total_cost"], prev["total_cost"]),
+
+        "top3": top3,
+        "daily": curr["daily"],
+        "items": curr["items"],
+        "unknown_price_items": curr["unknown_price_items"],
+
+        "chart_daily_labels": [d["label"] for d in curr["daily"]],
+        "chart_daily_costs": [d["cost"] for d in curr["daily"]],
+        "chart_item_labels": [x["item"] for x in top_items_for_chart],
+        "chart_item_costs": [x["cost"] for x in top_items_for_chart],
+    }
+
+# Weeks of /waste/weekly kept cached per location; any ?start= is a new key, so keep the
+# most recently viewed ones only.
+WEEKLY_DASHBOARD_CACHE_WEEKS = int(os.getenv("WEEKLY_DASHBOARD_CACHE_WEEKS", "52"))
+
+def weekly_dashboard(start_date: date) -> dict:
+    """Everything /waste/weekly shows for one week, cached per week until the data changes."""
+    if _rollups_signature() != _waste_source_signature():
+        load_waste_rollup_week(start_date.isoformat())  # rebuild stale rollups before caching
+    return cached_load(
+        f"weekly_dashboard:{start_date.isoformat()}",
+        waste_data_files(),
+        lambda: _build_weekly_dashboard(start_date),
+        group="weekly_dashboard",
+        max_entries=WEEKLY_DASHBOARD_CACHE_WEEKS,
+    )
+
+@app.route("/waste/weekly", methods=["GET"])
+def waste_weekly():
+    not_modified = not_modified_or_none(
+        data_version(waste_data_files()), date.today().isoformat(), request.args.get("start")
+    )
+    if not_modified:
+        return not_modified
+
+    start_date = _weekly_start_arg()
+
+    # Build week dropdown (last 12 weeks)
+    this_monday = monday_of_week(date.today())
+    week_options = []
+    for w in range(12):
+        sd = this_monday - timedelta(days=7 * w)
+        week_options.append({"iso": sd.isoformat(), "label": f"Week of {display_full_date(sd)}"})
 
+    dashboard = weekly_dashboard(start_date)
     return render_template(
         "waste_weekly.html",
-        start_iso=start_date.isoformat(),
-        end_iso=end_date.isoformat(),
-        start_label=display_full_date(start_date),
-        end_label=display_full_date(end_date),
         week_options=week_options,
         selected_start_iso=start_date.isoformat(),
+        dashboard=dashboard,
+        **dashboard,
+    )
 
-        total_qty=curr["total_qty"],
-        total_cost=curr["total_cost"],
-
-        prev_total_qty=prev["total_qty"],
-        prev_total_cost=prev["total_cost"],
-        delta_qty=delta_qty,
-        delta_cost=delta_cost,
-        pct_qty=pct_qty,
-        pct_cost=pct_cost,
-
-        top3=top3,
-        daily=curr["daily"],
-        items=curr["items"],
-        unknown_price_items=curr["unknown_price_items"],
-
-        chart_daily_labels=chart_daily_labels,
-        chart_daily_costs=chart_daily_costs,
-        chart_item_labels=chart_item_labels,
-        chart_item_costs=chart_item_costs,
+@app.route("/api/waste/weekly", methods=["GET"])
+def api_waste_weekly():
+    """The /waste/weekly data for ?start= (any day of the week) as JSON, for redrawing in place."""
+    start_date = _weekly_start_arg()
+    not_modified = not_modified_or_none(data_version(waste_data_files()), start_date.isoformat())
+    if not_modified:
+        return not_modified
+    return jsonify(weekly_dashboard(start_date))
+
+def _trends_args():
+    end_str = (request.args.get("end") or "").strip()
+    end_date = parse_iso_date(end_str) if end_str else date.today()
+    if not end_date:
+        abort(400, "Invalid end. Expected YYYY-MM-DD")
+    try:
+        weeks = int(request.args.get("weeks", TREND_WEEKS_DEFAULT))
+    except ValueError:
+        abort(400, "Invalid weeks")
+    weeks = max(TREND_MOVING_AVG_WEEKS, min(weeks, TREND_WEEKS_MAX))
+    # The report reaches back two windows (or a year) plus the moving average, and ends on a Sunday.
+    reach = timedelta(days=7 * (weeks + max(weeks, 52) + TREND_MOVING_AVG_WEEKS))
+    if not date.min + reach <= end_date <= date.max - timedelta(days=7):
+        abort(400, "end is out of range")
+    return end_date, weeks
+
+@app.route("/waste/trends", methods=["GET"])
+def waste_trends():
+    end_date, weeks = _trends_args()
+    not_modified = not_modified_or_none(data_version(waste_data_files()), date.today().isoformat(), end_date.isoformat(), weeks)
+    if not_modified:
+        return not_modified
+
+    report = build_trends_report(end_date, weeks)
+    return render_template(
+        "waste_trends.html",
+        report=report,
+        week_choices=(12, 26, 52, 104, 156),
+        **report,
     )
 
+@app.route("/api/waste/trends", methods=["GET"])
+def api_waste_trends():
+    """?weeks=N (4..156, default 52) ending with the week containing ?end= (default today)."""
+    end_date, weeks = _trends_args()
+    not_modified = not_modified_or_none(data_version(waste_data_files()), end_date.isoformat(), weeks)
+    if not_modified:
+        return not_modified
+    return jsonify(build_trends_report(end_date, weeks))
+
 @app.route("/waste/weekly/export", methods=["GET"])
 def export_waste_weekly():
     start_str = (request.args.get("start") or "").strip()
@@ -1103,18 +4053,13 @@ def export_waste_weekly():
 
     start_date = monday_of_week(start_date)
 
-    agg = weekly_waste_aggregate_for_export(start_date)
-    wb = build_weekly_waste_workbook(start_date, agg)
-
-    buf = BytesIO()
-    wb.save(buf)
-    buf.seek(0)
+    path = cached_weekly_waste_workbook(start_date)
 
     end_date = start_date + timedelta(days=6)
     filename = f"weekly_waste_{start_date.isoformat()}_to_{end_date.isoformat()}.xlsx"
 
     return send_file(
-        buf,
+        path,
         as_attachment=True,
         download_name=filename,
         mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
@@ -1122,10 +4067,33 @@ def export_waste_weekly():
 
 
 
+@app.route("/api/waste/range", methods=["GET"])
+def api_waste_range():
+    start_date = parse_iso_date((request.args.get("start") or "").strip())
+    end_date = parse_iso_date((request.args.get("end") or "").strip())
+    if not start_date or not end_date:
+        abort(400, "Invalid start/end. Expected YYYY-MM-DD")
+    if end_date < start_date:
+        abort(400, "end must not be before start")
+    if (end_date - start_date).days + 1 > WASTE_RANGE_MAX_DAYS:
+        abort(400, f"Range is limited to {WASTE_RANGE_MAX_DAYS} days")
+
+    group = (request.args.get("group") or "day").strip().lower()
+    if group not in WASTE_RANGE_GROUPS:
+        abort(400, f"Invalid group. Expected one of: {', '.join(WASTE_RANGE_GROUPS)}")
+
+    _, price_map = pastry_items_and_price_map()
+    return jsonify(aggregate_waste_range(start_date, end_date, group, price_map))
+
+
 @app.route("/waste/prices", methods=["GET"])
 def waste_prices():
+    not_modified = not_modified_or_none(data_version(price_data_files()), date.today().isoformat())
+    if not_modified:
+        return not_modified
+
     items = load_pastry_prices()
-    return render_template("waste_prices.html", items=items)
+    return render_template("waste_prices.html", items=items, today_iso=date.today().isoformat())
 
 @app.route("/waste/prices/save", methods=["POST"])
 def waste_prices_save():
@@ -1161,9 +4129,114 @@ def waste_prices_save():
     # Optional: sort A→Z
     cleaned.sort(key=lambda x: x["name"].lower())
 
-    save_pastry_prices(cleaned)
-    return jsonify(success=True, count=len(cleaned))
-
+    # Price changes apply from today unless the request back-dates them.
+    effective_str = str(payload.get("effective") or "").strip()
+    effective = parse_iso_date(effective_str) if effective_str else date.today()
+    if not effective:
+        abort(400, "Invalid effective date. Expected YYYY-MM-DD")
+
+    history = price_changes(load_pastry_prices(), cleaned, effective)
+    save_pastry_prices(cleaned, history)
+    return jsonify(success=True, count=len(cleaned), changed=len(history))
+
+@app.route("/waste/prices/history", methods=["GET"])
+def waste_prices_history():
+    """Price changes per item, oldest first ({"effective": null} = price before history began)."""
+    timeline = load_price_timeline()
+    return jsonify({name: timeline.changes(name) for name in sorted(timeline.names(), key=str.lower)})
+
+
+@app.route("/persist/status", methods=["GET"])
+def persist_status_view():
+    return jsonify(persist_status())
+
+@app.route("/cache/status", methods=["GET"])
+def cache_status_view():
+    return jsonify(data_cache_stats())
+
+@app.route("/metrics", methods=["GET"])
+def metrics_view():
+    persist = persist_status()
+    cache = data_cache_stats()
+    gauges = {
+        "redchurch_persist_queue_depth": ("gauge", "Files waiting for the next background push.", [((), persist["queue_depth"])]),
+        "redchurch_persist_background_total": ("counter", "Background push batches by result.", [
+            ((("result", "ok"),), persist["pushes"]),
+            ((("result", "error"),), persist["failures"]),
+        ]),
+        "redchurch_data_cache_total": ("counter", "Parsed-JSON cache lookups by result.", [
+            ((("result", "hit"),), cache["hits"]),
+            ((("result", "miss"),), cache["misses"]),
+        ]),
+    }
+    return app.response_class(render_metrics(gauges), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.cli.command("waste-db-migrate")
+@location_command
+def waste_db_migrate_command():
+    """Import waste_logs.json and pastry_prices.json into the SQLite database."""
+    n = migrate_waste_json_to_sqlite()
+    print(f"[OK] Imported {n} waste log days into {loc_tmp(WASTE_DB_PATH)}")
+
+@app.cli.command("waste-db-export")
+@location_command
+def waste_db_export_command():
+    """Write the SQLite waste entries back to waste_logs.json and push it."""
+    n = export_waste_sqlite_to_json()
+    print(f"[OK] Exported {n} waste log days to {loc_file(WASTE_FILE)}")
+
+@app.cli.command("rebuild-waste-rollups")
+@location_command
+def rebuild_waste_rollups_command():
+    """Regenerate the weekly/daily waste rollups from the raw logs."""
+    rollups = rebuild_waste_rollups()
+    print(f"[OK] Rebuilt rollups for {len(rollups['days'])} days, {len(rollups['weeks'])} weeks")
+
+@app.cli.command("check-waste-rollups")
+@location_command
+def check_waste_rollups_command():
+    """Compare the rollups against a fresh aggregation of the raw logs."""
+    mismatched = check_waste_rollups()
+    if mismatched:
+        print(f"[WARN] Rollups differ from the raw logs for weeks: {', '.join(mismatched)}")
+        raise SystemExit(1)
+    print("[OK] Rollups match the raw logs")
+
+@app.cli.command("compact-waste-journal")
+@location_command
+def compact_waste_journal_command():
+    """Fold waste_logs.journal.jsonl into waste_logs.json and push both."""
+    n = compact_waste_journal()
+    if n:
+        git_push_files_if_possible([loc_file(WASTE_FILE), loc_file(WASTE_JOURNAL_FILE)], "Compact waste log journal")
+    print(f"[OK] Compacted {n} journal record(s)")
+
+@app.cli.command("seed-location-prices")
+@location_command
+def seed_location_prices_command():
+    """Give a new location a copy of the default location's pastry price list."""
+    if current_location() is DEFAULT_LOCATION:
+        raise click.UsageError("pass --location <slug> for the location to seed")
+    if load_pastry_prices():
+        print(f"[WARN] {loc_file(PASTRY_PRICES_FILE)} already has prices; leaving it alone")
+        return
+    with using_location(DEFAULT_LOCATION):
+        items = load_pastry_prices()
+    save_pastry_prices([dict(x) for x in items])
+    print(f"[OK] Copied {len(items)} pastry prices to {loc_file(PASTRY_PRICES_FILE)}")
+
+@app.cli.command("waste-weekly-locations")
+@click.option("--start", default=None, help="Any day in the week (default: this week).")
+def waste_weekly_locations_command(start):
+    """Print one week's waste per location and combined."""
+    start_date = parse_iso_date(start) if start else date.today()
+    if not start_date:
+        raise click.BadParameter("expected YYYY-MM-DD", param_hint="--start")
+    week = cross_location_week_rollup(monday_of_week(start_date))
+    for loc in week["locations"]:
+        print(f"{loc['slug']:<20} {loc['total_qty']:>8} {loc['total_cost']:>12.2f}")
+    print(f"{'all':<20} {week['total_qty']:>8} {week['total_cost']:>12.2f}")
 
 
 if __name__ == "__main__":
@@ -1,3 +1,6 @@
+// Root of the current location (e.g. "/loc/dundas"), so fetches stay in the same shard.
+const APP_ROOT = document.querySelector('meta[name="app-root"]')?.content || "";
+
 document.addEventListener("DOMContentLoaded", () => {
 
     const searchInput = document.getElementById("searchInput");
@@ -45,7 +48,7 @@ document.addEventListener("DOMContentLoaded", () => {
     addBox.classList.add("hidden");
 
   document.getElementById("resetSearchBtn").onclick = () =>
-    (window.location.href = "/");
+    (window.location.href = `${APP_ROOT}/`);
 
   const modal = document.getElementById("orderSummaryModal");
   const summaryList = document.getElementById("summaryList");
@@ -54,7 +57,7 @@ document.addEventListener("DOMContentLoaded", () => {
       summaryList.innerHTML = "<p>Loading…</p>";
       modal.classList.remove("hidden");
 
-      const res = await fetch("/order_summary");
+      const res = await fetch(`${APP_ROOT}/order_summary`);
       const items = await res.json();
 
       if (items.length === 0) {
@@ -91,7 +94,7 @@ document.addEventListener("DOMContentLoaded", () => {
   if (emailBtn) {
       emailBtn.addEventListener("click", async () => {
           try {
-              const res = await fetch("/email");
+              const res = await fetch(`${APP_ROOT}/email`);
               const data = await res.json();
 
               const isMobile =
@@ -190,7 +193,7 @@ document.addEventListener("DOMContentLoaded", () => {
 
           const formData = new FormData(form);
 
-          await fetch("/add_to_order", {
+          await fetch(`${APP_ROOT}/add_to_order`, {
               method: "POST",
               body: formData,
               headers: {
@@ -227,7 +230,7 @@ function attachRemoveHandler(form) {
         const formData = new FormData(form);
         const row = form.closest(".summary-row");
 
-        await fetch("/remove_from_order", {
+        await fetch(`${APP_ROOT}/remove_from_order`, {
             method: "POST",
             body: formData,
             headers: {
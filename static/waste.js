@@ -1,3 +1,6 @@
+// Root of the current location (e.g. "/loc/dundas"), so fetches stay in the same shard.
+const APP_ROOT = document.querySelector('meta[name="app-root"]')?.content || "";
+
 function clampInt(n, min, max) {
   const x = parseInt(n, 10);
   if (Number.isNaN(x)) return min;
@@ -11,6 +14,112 @@ function setQty(controlEl, qty) {
   if (display) display.textContent = String(q);
 }
 
+function rowValues(tr) {
+  return {
+    item: tr.querySelector(".waste-item")?.value?.trim() || "",
+    qty: parseInt(tr.querySelector(".qty-control")?.dataset?.qty || "1", 10),
+    reason: tr.querySelector(".waste-reason")?.value?.trim() || "Other",
+  };
+}
+
+// Entry-level changes since the last save: adds for new rows, updates for edited rows,
+// deletes for rows that were removed (or had their item cleared).
+function diffRows(rowsTbody, savedEntries) {
+  const ops = [];
+  const addedRows = [];
+  const seen = new Set();
+
+  rowsTbody.querySelectorAll("tr").forEach((tr) => {
+    const id = tr.dataset.entryId || "";
+    const v = rowValues(tr);
+
+    if (id && savedEntries.has(id)) {
+      seen.add(id);
+      if (!v.item) {
+        ops.push({ op: "delete", id });
+        return;
+      }
+      const old = savedEntries.get(id);
+      const changes = {};
+      ["item", "qty", "reason"].forEach((k) => {
+        if (v[k] !== old[k]) changes[k] = v[k];
+      });
+      if (Object.keys(changes).length) ops.push({ op: "update", id, entry: changes });
+    } else if (v.item) {
+      ops.push({ op: "add", entry: v });
+      addedRows.push(tr);
+    }
+  });
+
+  savedEntries.forEach((_, id) => {
+    if (!seen.has(id)) ops.push({ op: "delete", id });
+  });
+  return { ops, addedRows };
+}
+
+function snapshotRows(rowsTbody) {
+  const saved = new Map();
+  rowsTbody?.querySelectorAll("tr").forEach((tr) => {
+    const id = tr.dataset.entryId || "";
+    const v = rowValues(tr);
+    if (id && v.item) saved.set(id, v);
+  });
+  return saved;
+}
+
+// A row for a stored entry, built from the same template as "Add row".
+function rowFromEntry(template, entry) {
+  const tr = template.content.cloneNode(true).querySelector("tr");
+  tr.dataset.entryId = entry.id || "";
+
+  const itemSel = tr.querySelector(".waste-item");
+  if (itemSel && entry.item) {
+    if (!Array.from(itemSel.options).some((o) => o.value === entry.item)) {
+      // Inactive item: keep it visible for history, like the server-rendered rows.
+      const opt = new Option(`${entry.item} (inactive)`, entry.item);
+      opt.disabled = true;
+      itemSel.add(opt, 1);
+    }
+    itemSel.value = entry.item;
+  }
+  const reasonSel = tr.querySelector(".waste-reason");
+  if (reasonSel && entry.reason) reasonSel.value = entry.reason;
+  tr.querySelector(".qty-control").dataset.qty = String(entry.qty || 1);
+
+  wireRow(tr);
+  return tr;
+}
+
+// Rebuild the table from the stored day, then replay this device's unsaved ops on top.
+// An edit to an entry that was deleted elsewhere comes back as a new row.
+function rebaseRows(rowsTbody, template, entries, ops, pending) {
+  const rows = new Map();
+  rowsTbody.replaceChildren();
+  entries.forEach((e) => {
+    const tr = rowFromEntry(template, e);
+    rowsTbody.appendChild(tr);
+    rows.set(e.id, tr);
+  });
+
+  ops.forEach((op) => {
+    if (op.op === "add") {
+      rowsTbody.appendChild(rowFromEntry(template, op.entry));
+      return;
+    }
+    const tr = rows.get(op.id);
+    if (op.op === "delete") {
+      tr?.remove();
+      return;
+    }
+    const values = pending.get(op.id);
+    if (!tr) {
+      rowsTbody.appendChild(rowFromEntry(template, { ...values, id: "" }));
+      return;
+    }
+    tr.replaceWith(rowFromEntry(template, { ...rowValues(tr), ...op.entry, id: op.id }));
+  });
+}
+
 function wireRow(rowEl) {
   const control = rowEl.querySelector(".qty-control");
   const minus = rowEl.querySelector(".qty-btn.minus");
@@ -43,10 +152,12 @@ document.addEventListener("DOMContentLoaded", () => {
   const saveBtn = document.getElementById("saveWasteBtn");
   const statusEl = document.getElementById("saveStatus");
   const dateIsoEl = document.getElementById("wasteDateIso");
+  const versionEl = document.getElementById("wasteDayVersion");
   const template = document.getElementById("wasteRowTemplate");
 
   // Wire existing rows
   rowsTbody?.querySelectorAll("tr").forEach(wireRow);
+  let savedEntries = snapshotRows(rowsTbody);
 
   addBtn?.addEventListener("click", () => {
     if (!rowsTbody || !template) return;
@@ -62,17 +173,13 @@ document.addEventListener("DOMContentLoaded", () => {
     if (!rowsTbody || !dateIsoEl) return;
 
     const dateIso = (dateIsoEl.value || "").trim();
-    const entries = [];
+    const { ops, addedRows } = diffRows(rowsTbody, savedEntries);
+    const pending = snapshotRows(rowsTbody);
 
-    rowsTbody.querySelectorAll("tr").forEach((tr) => {
-      const item = tr.querySelector(".waste-item")?.value?.trim() || "";
-      const reason = tr.querySelector(".waste-reason")?.value?.trim() || "Other";
-      const qty = parseInt(tr.querySelector(".qty-control")?.dataset?.qty || "1", 10);
-
-      if (item) {
-        entries.push({ item, qty, reason });
-      }
-    });
+    if (!ops.length) {
+      statusEl.textContent = "No changes to save";
+      return;
+    }
 
     // UI feedback
     statusEl.textContent = "";
@@ -80,19 +187,48 @@ document.addEventListener("DOMContentLoaded", () => {
     saveBtn.textContent = "Saving...";
 
     try {
-      const res = await fetch("/waste/save", {
-        method: "POST",
+      const res = await fetch(`${APP_ROOT}/waste/day/${encodeURIComponent(dateIso)}`, {
+        method: "PATCH",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ date: dateIso, entries }),
+        body: JSON.stringify({ version: parseInt(versionEl?.value || "0", 10), ops }),
       });
 
+      if (res.status === 409) {
+        // Someone else changed this day: show their version with our unsaved changes
+        // reapplied, and let the user check it before saving again.
+        const data = await res.json();
+        const entries = data.entries || [];
+        rebaseRows(rowsTbody, template, entries, ops, pending);
+        if (versionEl) versionEl.value = String(data.version);
+        savedEntries = new Map(
+          entries.map((e) => [e.id, { item: e.item, qty: e.qty, reason: e.reason || "Other" }])
+        );
+        statusEl.textContent =
+          "This day was changed on another device. Your changes were reapplied to the latest version; review them and save again.";
+        return;
+      }
+
       if (!res.ok) {
         const msg = await res.text();
         throw new Error(msg || "Save failed");
       }
 
       const data = await res.json();
-      statusEl.textContent = `Saved (${data.saved || 0} items)`;
+      const renamed = data.renamed || {};
+      rowsTbody.querySelectorAll("tr").forEach((tr) => {
+        const id = tr.dataset.entryId || "";
+        if (renamed[id]) tr.dataset.entryId = renamed[id];
+      });
+      addedRows.forEach((tr, i) => {
+        tr.dataset.entryId = (data.added || [])[i] || "";
+      });
+      rowsTbody.querySelectorAll("tr").forEach((tr) => {
+        if (!rowValues(tr).item) tr.dataset.entryId = "";
+      });
+      if (versionEl) versionEl.value = String(data.version);
+      savedEntries = snapshotRows(rowsTbody);
+
+      statusEl.textContent = `Saved (${(data.entries || []).length} items)`;
     } catch (err) {
       statusEl.textContent = "Couldn’t save. Please try again.";
       console.error(err);
@@ -103,9 +239,40 @@ document.addEventListener("DOMContentLoaded", () => {
   });
 
     const viewDateSelect = document.getElementById("viewDateSelect");
+    let shownDateIso = viewDateSelect?.value;
+
+    // "Older days…" pulls the next page of logged dates in place instead of navigating.
+    async function loadOlderDates(moreOpt) {
+    moreOpt.disabled = true;
+    viewDateSelect.value = shownDateIso;
+    const res = await fetch(`${APP_ROOT}/api/waste/dates?before=${encodeURIComponent(moreOpt.dataset.before)}`);
+    if (!res.ok) {
+        moreOpt.disabled = false;
+        alert("Could not load older days.");
+        return;
+    }
+    const data = await res.json();
+    const present = new Set(Array.from(viewDateSelect.options, (o) => o.value));
+    for (const d of data.dates) {
+        if (present.has(d.iso)) continue;
+        viewDateSelect.insertBefore(new Option(d.label, d.iso), moreOpt);
+    }
+    if (data.next) {
+        moreOpt.dataset.before = data.next;
+        moreOpt.disabled = false;
+    } else {
+        moreOpt.remove();
+    }
+    viewDateSelect.value = shownDateIso;
+    }
+
     viewDateSelect?.addEventListener("change", () => {
     const iso = viewDateSelect.value;
-    window.location.href = `/waste?date=${encodeURIComponent(iso)}`;
+    if (iso === "__more") {
+        loadOlderDates(viewDateSelect.selectedOptions[0]);
+        return;
+    }
+    window.location.href = `${APP_ROOT}/waste?date=${encodeURIComponent(iso)}`;
     });
 
 
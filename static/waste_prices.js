@@ -1,3 +1,6 @@
+// Root of the current location (e.g. "/loc/dundas"), so fetches stay in the same shard.
+const APP_ROOT = document.querySelector('meta[name="app-root"]')?.content || "";
+
 document.addEventListener("DOMContentLoaded", () => {
   const rows = document.getElementById("priceRows");
   const addBtn = document.getElementById("addPriceRow");
@@ -41,6 +44,8 @@ document.addEventListener("DOMContentLoaded", () => {
     wireRow(tr);
   });
 
+  const effectiveEl = document.getElementById("priceEffective");
+
   saveBtn?.addEventListener("click", async () => {
     if (!rows) return;
 
@@ -68,10 +73,10 @@ document.addEventListener("DOMContentLoaded", () => {
     saveBtn.textContent = "Saving...";
 
     try {
-      const res = await fetch("/waste/prices/save", {
+      const res = await fetch(`${APP_ROOT}/waste/prices/save`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ items }),
+        body: JSON.stringify({ items, effective: effectiveEl?.value || undefined }),
       });
 
       if (!res.ok) throw new Error(await res.text());
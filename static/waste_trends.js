@@ -0,0 +1,20 @@
+document.addEventListener("DOMContentLoaded", () => {
+  const report = JSON.parse(document.getElementById("trendsData").textContent);
+
+  new Chart(document.getElementById("trendCostChart"), {
+    type: "bar",
+    data: {
+      labels: report.chart_labels,
+      datasets: [
+        { type: "bar", label: "Cost ($)", data: report.weekly_cost },
+        { type: "line", label: `${report.moving_avg_weeks}-week average ($)`, data: report.moving_avg_cost, pointRadius: 0, tension: 0.3 },
+        { type: "line", label: "Same week last year ($)", data: report.last_year_cost, pointRadius: 0, borderDash: [6, 4] }
+      ]
+    },
+    options: {
+      responsive: true,
+      plugins: { legend: { display: true } },
+      scales: { y: { beginAtZero: true } }
+    }
+  });
+});
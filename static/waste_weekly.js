@@ -0,0 +1,116 @@
+// Root of the current location (e.g. "/loc/dundas"), so fetches stay in the same shard.
+const APP_ROOT = document.querySelector('meta[name="app-root"]')?.content || "";
+
+function money(n) {
+  return `$${Number(n).toFixed(2)}`;
+}
+
+function pctSuffix(pct) {
+  return pct === null || pct === undefined ? "" : ` (${pct}%)`;
+}
+
+function row(cells) {
+  const tr = document.createElement("tr");
+  for (const [content, className] of cells) {
+    const td = document.createElement("td");
+    if (className) td.className = className;
+    if (content instanceof Node) td.appendChild(content);
+    else td.textContent = content;
+    tr.appendChild(td);
+  }
+  return tr;
+}
+
+function barChart(canvasId, labels, data) {
+  return new Chart(document.getElementById(canvasId), {
+    type: "bar",
+    data: {
+      labels,
+      datasets: [{ label: "Cost ($)", data }]
+    },
+    options: {
+      responsive: true,
+      plugins: { legend: { display: true } },
+      scales: { y: { beginAtZero: true } }
+    }
+  });
+}
+
+function setChartData(chart, labels, data) {
+  chart.data.labels = labels;
+  chart.data.datasets[0].data = data;
+  chart.update();
+}
+
+document.addEventListener("DOMContentLoaded", () => {
+  const form = document.getElementById("weekForm");
+  const weekSelect = document.getElementById("weekStart");
+  const exportLink = document.getElementById("exportWeekLink");
+  const top3Body = document.getElementById("top3Body");
+  const dailyBody = document.getElementById("dailyBody");
+
+  const initial = JSON.parse(document.getElementById("weeklyData").textContent);
+  const dailyChart = barChart("dailyCostChart", initial.chart_daily_labels, initial.chart_daily_costs);
+  const itemChart = barChart("itemCostChart", initial.chart_item_labels, initial.chart_item_costs);
+
+  function render(d) {
+    document.getElementById("weekRange").textContent = `Week: ${d.start_label} → ${d.end_label}`;
+
+    document.getElementById("totalQty").textContent = d.total_qty;
+    document.getElementById("totalQtySub").textContent = `vs last week: ${d.delta_qty}${pctSuffix(d.pct_qty)}`;
+    document.getElementById("totalCost").textContent = money(d.total_cost);
+    document.getElementById("totalCostSub").textContent = `vs last week: ${money(d.delta_cost)}${pctSuffix(d.pct_cost)}`;
+
+    document.getElementById("unknownPriceNote").hidden = d.unknown_price_items.length === 0;
+    document.getElementById("unknownPriceItems").textContent = d.unknown_price_items.join(", ");
+
+    top3Body.replaceChildren(...d.top3.map((r) => row([
+      [r.item],
+      [r.qty, "qty-col"],
+      [money(r.cost), "qty-col"],
+      [money(r.prev_cost), "qty-col"],
+      [`${money(r.delta_cost)}${pctSuffix(r.pct_cost)}`, "qty-col"],
+    ])));
+
+    dailyBody.replaceChildren(...d.daily.map((day) => {
+      const link = document.createElement("a");
+      link.className = "link";
+      link.href = `${dailyBody.dataset.dayUrl}?date=${encodeURIComponent(day.iso)}`;
+      link.textContent = "Open";
+      return row([[day.label], [day.qty, "qty-col"], [money(day.cost), "qty-col"], [link]]);
+    }));
+
+    setChartData(dailyChart, d.chart_daily_labels, d.chart_daily_costs);
+    setChartData(itemChart, d.chart_item_labels, d.chart_item_costs);
+
+    const exportUrl = new URL(exportLink.href, window.location.href);
+    exportUrl.searchParams.set("start", d.start_iso);
+    exportLink.href = exportUrl.toString();
+    weekSelect.value = d.start_iso;
+  }
+
+  async function showWeek(startIso, push) {
+    let res;
+    try {
+      res = await fetch(`${APP_ROOT}/api/waste/weekly?start=${encodeURIComponent(startIso)}`);
+    } catch (err) {
+      res = null;
+    }
+    if (!res || !res.ok) {
+      form.submit(); // fall back to loading the page for that week
+      return;
+    }
+    const d = await res.json();
+    render(d);
+    if (push) history.pushState({ start: d.start_iso }, "", `?start=${encodeURIComponent(d.start_iso)}`);
+  }
+
+  history.replaceState({ start: initial.start_iso }, "");
+
+  weekSelect.addEventListener("change", () => showWeek(weekSelect.value, true));
+  form.addEventListener("submit", (e) => {
+    e.preventDefault();
+    showWeek(weekSelect.value, true);
+  });
+  window.addEventListener("popstate", (e) => showWeek(e.state?.start || initial.start_iso, false));
+});
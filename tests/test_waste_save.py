@@ -0,0 +1,115 @@
+"""
+The waste save endpoints: entries carry the price in effect on their own date, and a
+save based on an old version of a day is refused instead of overwriting it.
+
+    python -m pytest tests
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(HERE)
+
+# Keep every data and derived file inside a temp dir and make sure nothing is pushed.
+WORKDIR = tempfile.mkdtemp(prefix="redchurch-test-")
+os.environ.pop("GITHUB_TOKEN", None)
+os.environ["WASTE_ROLLUPS_PATH"] = os.path.join(WORKDIR, "rollups")
+os.environ["WASTE_EXPORT_CACHE_DIR"] = os.path.join(WORKDIR, "exports")
+os.environ["WASTE_DB_PATH"] = os.path.join(WORKDIR, "waste.db")
+os.environ["CART_FILE_PATH"] = os.path.join(WORKDIR, "cart.json")
+os.environ["FILE_LOCK_DIR"] = os.path.join(WORKDIR, "locks")
+sys.path.insert(0, REPO_DIR)
+import app as app_module  # noqa: E402
+
+
+class BackfillAcrossPriceChangeTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp(dir=WORKDIR)
+        app_module.REPO_DIR = self.workdir
+        app_module.WASTE_ROLLUPS_PATH = os.path.join(self.workdir, "rollups")
+        with open(os.path.join(self.workdir, "pastry_prices.json"), "w", encoding="utf-8") as f:
+            json.dump([{"name": "Croissant", "price": 0.0, "active": True}], f)
+        self.client = app_module.app.test_client()
+
+        # 0.00 until 2026-09-01, 10.00 from then on.
+        r = self.client.post("/waste/prices/save", json={
+            "items": [{"name": "Croissant", "price": 10.0, "active": True}],
+            "effective": "2026-09-01",
+        })
+        self.assertEqual(r.status_code, 200)
+
+    def tearDown(self):
+        app_module.REPO_DIR = REPO_DIR
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def stored_prices(self, date_iso):
+        day = app_module.load_waste_store().day(date_iso) or {"entries": []}
+        return [e["unit_price"] for e in day["entries"]]
+
+    def test_batch_backfill_uses_price_on_entry_date(self):
+        r = self.client.post("/waste/save_batch", json={"days": [
+            {"date": "2026-03-02", "entries": [{"item": "Croissant", "qty": 2}]},
+            {"date": "2026-09-02", "entries": [{"item": "Croissant", "qty": 1}]},
+        ]})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(self.stored_prices("2026-03-02"), [0.0])
+        self.assertEqual(self.stored_prices("2026-09-02"), [10.0])
+
+    def test_save_and_patch_use_price_on_entry_date(self):
+        r = self.client.post("/waste/save", json={
+            "date": "2026-03-03", "version": 0, "entries": [{"item": "Croissant", "qty": 1}],
+        })
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(self.stored_prices("2026-03-03"), [0.0])
+
+        r = self.client.patch("/waste/day/2026-03-04", json={
+            "version": 0, "ops": [{"op": "add", "entry": {"item": "Croissant", "qty": 3}}],
+        })
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(self.stored_prices("2026-03-04"), [0.0])
+
+
+class SaveVersionTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp(dir=WORKDIR)
+        app_module.REPO_DIR = self.workdir
+        app_module.WASTE_ROLLUPS_PATH = os.path.join(self.workdir, "rollups")
+        with open(os.path.join(self.workdir, "pastry_prices.json"), "w", encoding="utf-8") as f:
+            json.dump([{"name": "Croissant", "price": 2.0, "active": True}], f)
+        self.client = app_module.app.test_client()
+
+    def tearDown(self):
+        app_module.REPO_DIR = REPO_DIR
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def save(self, version, qty):
+        return self.client.post("/waste/save", json={
+            "date": "2026-03-03", "version": version, "entries": [{"item": "Croissant", "qty": qty}],
+        })
+
+    def test_stale_save_is_refused(self):
+        r = self.save(0, 1)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.get_json()["version"], 1)
+
+        r = self.save(0, 5)
+        self.assertEqual(r.status_code, 409)
+        self.assertEqual(r.get_json()["version"], 1)
+        self.assertEqual([e["qty"] for e in r.get_json()["entries"]], [1])
+
+        r = self.save(1, 5)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.get_json()["version"], 2)
+        self.assertEqual([e["qty"] for e in app_module.load_waste_store().day("2026-03-03")["entries"]], [5])
+
+    def test_version_is_required(self):
+        r = self.client.post("/waste/save", json={"date": "2026-03-03", "entries": []})
+        self.assertEqual(r.status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()